@@ -0,0 +1,122 @@
+"""Content-addressed cache of synthesized speech for the TTS worker"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+def cache_key(text: str, voice: str, lang: str, speed: float, sample_rate: int) -> str:
+    """Hash of everything that determines the generated audio"""
+    normalized = re.sub(r'\s+', ' ', text.strip())
+    return hashlib.sha256(f"{normalized}\0{voice}\0{lang}\0{speed:g}\0{sample_rate}".encode('utf-8')).hexdigest()
+
+class AudioCache:
+    """
+    Two-tier LRU of float32 audio: an in-memory tier bounded by memory_bytes
+    and an on-disk tier of .npy files bounded by disk_bytes. Memory hits are
+    promoted on use; disk files are ordered by modification time, which is
+    refreshed on every hit. A full disk tier is trimmed down to low_water
+    of its size, so the directory scan runs once per batch of evictions
+    rather than on every new entry.
+    """
+
+    def __init__(self, memory_bytes: int, disk_bytes: int = 0, directory: Optional[Path] = None, low_water: float = 0.9):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.low_water = low_water
+        self.directory = Path(directory) if directory and disk_bytes > 0 else None
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.trims = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._disk_used = sum(f.stat().st_size for f in self.directory.glob('*.npy'))
+            self._trim_disk()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return audio
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                audio = np.load(path)
+                os.utime(path)
+            except (OSError, ValueError):
+                audio = None
+            if audio is not None:
+                self._remember(key, audio)
+                with self._lock:
+                    self.disk_hits += 1
+                return audio
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, audio: np.ndarray):
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        self._remember(key, audio)
+        if self.directory is not None and not self._path(key).exists():
+            # Write under a temporary name so readers never see a partial file
+            tmp_path = self.directory / f"{key}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, audio)
+            os.replace(tmp_path, self._path(key))
+            with self._lock:
+                self._disk_used += self._path(key).stat().st_size
+            self._trim_disk()
+
+    def _remember(self, key: str, audio: np.ndarray):
+        if audio.nbytes > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_used -= old.nbytes
+            self._memory[key] = audio
+            self._memory_used += audio.nbytes
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= evicted.nbytes
+
+    def _trim_disk(self):
+        with self._lock:
+            if self._disk_used <= self.disk_bytes:
+                return
+            target = self.disk_bytes * self.low_water
+            files = sorted(self.directory.glob('*.npy'), key=lambda f: f.stat().st_mtime)
+            for f in files:
+                if self._disk_used <= target:
+                    break
+                size = f.stat().st_size
+                f.unlink(missing_ok=True)
+                self._disk_used -= size
+            self.trims += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_bytes": self._disk_used,
+                "disk_trims": self.trims,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
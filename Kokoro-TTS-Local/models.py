@@ -89,10 +89,18 @@ VOICE_FILES = [
 original_load_voice = KPipeline.load_voice
 
 def patched_load_voice(self, voice_path):
-    """Load voice model with weights_only=False for compatibility"""
+    """Load voice model with weights_only=False for compatibility
+    
+    Voice tensors are returned as they are, and voices already in
+    self.voices are returned without touching the disk.
+    """
+    if isinstance(voice_path, torch.Tensor):
+        return voice_path
+    voice_name = Path(voice_path).stem
+    if voice_name in getattr(self, 'voices', {}):
+        return self.voices[voice_name]
     if not os.path.exists(voice_path):
         raise FileNotFoundError(f"Voice file not found: {voice_path}")
-    voice_name = Path(voice_path).stem
     try:
         voice_model = torch.load(voice_path, weights_only=False)
         if voice_model is None:
@@ -214,6 +222,9 @@ except ImportError as e:
 _pipeline = None
 _pipeline_lock = threading.RLock()  # Reentrant lock for thread safety
 
+# Language codes KPipeline has a G2P frontend for
+LANGUAGE_CODES = ['a', 'b', 'e', 'f', 'h', 'i', 'j', 'p', 'z']
+
 def download_voice_files(voice_files=None, repo_version="main", required_count=1):
     """Download voice files from Hugging Face.
     
@@ -435,6 +446,25 @@ def build_model(model_path: str, device: str, repo_version: str = "main") -> KPi
             
         return _pipeline
 
+def build_language_pipeline(base: KPipeline, lang_code: str) -> KPipeline:
+    """Build a pipeline for another language that shares base's model weights
+    
+    Args:
+        base: Pipeline returned by build_model
+        lang_code: One of LANGUAGE_CODES
+        
+    Returns:
+        KPipeline with its own G2P frontend and base's KModel
+    """
+    if lang_code not in LANGUAGE_CODES:
+        raise ValueError(f"Unsupported language code '{lang_code}'")
+    if lang_code == base.lang_code:
+        return base
+    pipeline_instance = KPipeline(lang_code=lang_code, model=base.model)
+    pipeline_instance.device = base.device
+    pipeline_instance.voices = base.voices
+    return pipeline_instance
+
 def list_available_voices() -> List[str]:
     """List all available voice models"""
     # Always use absolute path for consistency
@@ -514,6 +544,75 @@ def load_voice(voice_name: str, device: str) -> torch.Tensor:
         # Load voice if not already loaded
         return pipeline.load_voice(voice_path)
 
+def pack_voices(packed_path: str, voice_names: Optional[List[str]] = None) -> List[str]:
+    """Save voices (all available ones by default) into one file that VoiceRegistry can memory-map
+    
+    Args:
+        packed_path: Where to write the packed file
+        voice_names: Voices to include, or None for every file in the voices directory
+        
+    Returns:
+        Names of the packed voices
+    """
+    voices = {}
+    for voice_name in voice_names or list_available_voices():
+        voice_path = os.path.abspath(os.path.join("voices", f"{voice_name}.pt"))
+        if not os.path.exists(voice_path):
+            print(f"Warning: Voice file not found: {voice_path}")
+            continue
+        voices[voice_name] = torch.load(voice_path, weights_only=False, map_location='cpu').contiguous()
+    torch.save(voices, packed_path)
+    return list(voices)
+
+class VoiceRegistry:
+    """Voice tensors loaded once, on the model's device, and looked up by name without disk I/O"""
+    
+    def __init__(self, device: str = 'cpu'):
+        self.device = device
+        self._voices = {}
+        # "loading" until the first load finishes, then "ready", or "failed" if it raised
+        self.state = "loading"
+    
+    def load(self, voice_names: Optional[List[str]] = None, packed_path: Optional[str] = None) -> List[str]:
+        """Load voices into the registry
+        
+        Args:
+            voice_names: Voices to load, or None for all of them
+            packed_path: File written by pack_voices to memory-map the voices from,
+                or None to read each voices/{name}.pt
+                
+        Returns:
+            Names of the loaded voices
+        """
+        try:
+            if packed_path:
+                # Tensors stay backed by the file on CPU, so worker processes share the pages
+                packed = torch.load(packed_path, mmap=True, weights_only=True, map_location='cpu')
+                voices = {name: packed[name] for name in voice_names or packed if name in packed}
+            else:
+                voices = {}
+                for voice_name in voice_names or list_available_voices():
+                    voice_path = os.path.abspath(os.path.join("voices", f"{voice_name}.pt"))
+                    if not os.path.exists(voice_path):
+                        print(f"Warning: Voice file not found: {voice_path}")
+                        continue
+                    voices[voice_name] = torch.load(voice_path, weights_only=False, map_location='cpu')
+            
+            for voice_name, voice in voices.items():
+                self._voices[voice_name] = voice.to(self.device)
+        except Exception:
+            if self.state == "loading":
+                self.state = "failed"
+            raise
+        self.state = "ready"
+        return list(voices)
+    
+    def get(self, voice_name: str) -> Optional[torch.Tensor]:
+        return self._voices.get(voice_name)
+    
+    def names(self) -> List[str]:
+        return list(self._voices)
+
 def generate_speech(
     model: KPipeline,
     text: str,
@@ -0,0 +1,108 @@
+"""Shared inference thread for sentence synthesis in the TTS worker"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, List
+
+class SynthesisScheduler:
+    """
+    Runs every synthesis job on one inference thread, serving requests in
+    rounds: each round takes the next sentence of every request with work
+    pending, so a short answer is not stuck behind a long one. When the
+    thread has been idle it waits window seconds before starting a round,
+    so requests arriving together share their first round.
+
+    Kokoro's model takes one utterance per forward pass, so a round runs
+    its jobs one after another rather than as a padded batch.
+    """
+
+    def __init__(self, run: Callable[..., Any], window: float = 0.015):
+        self.run = run
+        self.window = window
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.rounds = 0
+        self.jobs = 0
+        self.max_round = 0
+        self.busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._serve, name="synthesis", daemon=True)
+        self._thread.start()
+
+    def submit(self, request_id: str, *args) -> asyncio.Future:
+        """Queue run(*args) for a request; must be called from the event loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            self._pending.setdefault(request_id, deque()).append((loop, future, args))
+            self._condition.notify()
+        return future
+
+    def cancel(self, request_id: str):
+        """Drop a request's jobs that have not started yet"""
+        with self._condition:
+            jobs = self._pending.pop(request_id, ())
+        for loop, future, _ in jobs:
+            loop.call_soon_threadsafe(future.cancel)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _next_round(self) -> List[tuple]:
+        with self._condition:
+            if not self._pending:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while not self._closed and (remaining := deadline - time.monotonic()) > 0:
+                    self._condition.wait(remaining)
+            if self._closed:
+                return []
+            round_jobs = []
+            for request_id in list(self._pending):
+                jobs = self._pending[request_id]
+                round_jobs.append(jobs.popleft())
+                if not jobs:
+                    del self._pending[request_id]
+            return round_jobs
+
+    def _serve(self):
+        while True:
+            round_jobs = self._next_round()
+            if not round_jobs:
+                return
+            started = time.monotonic()
+            for loop, future, args in round_jobs:
+                if future.cancelled():
+                    continue
+                try:
+                    result = self.run(*args)
+                except Exception as e:
+                    loop.call_soon_threadsafe(_resolve, future, None, e)
+                else:
+                    loop.call_soon_threadsafe(_resolve, future, result, None)
+            self.rounds += 1
+            self.jobs += len(round_jobs)
+            self.max_round = max(self.max_round, len(round_jobs))
+            self.busy_seconds += time.monotonic() - started
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "jobs": self.jobs,
+            "avg_round": self.jobs / self.rounds if self.rounds else 0.0,
+            "max_round": self.max_round,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "waiting_requests": len(self._pending),
+        }
+
+def _resolve(future: asyncio.Future, result: Any, error: Exception):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -1,15 +1,22 @@
 import torch
 from typing import Optional, Tuple, List, Union
-from models import build_model, generate_speech, list_available_voices
+from models import build_model, build_language_pipeline, generate_speech, list_available_voices, pack_voices, VoiceRegistry, LANGUAGE_CODES
+from audio_cache import AudioCache, cache_key
+from scheduler import SynthesisScheduler
 from tqdm.auto import tqdm
 import soundfile as sf
 from pathlib import Path
 import numpy as np
 import time
 import os
+import re
 import sys
+import uuid
+import asyncio
+import threading
 from faststream import FastStream
-from faststream.rabbit import RabbitBroker
+from faststream.rabbit import RabbitBroker, RabbitResponse
+from faststream.rabbit.annotations import RabbitMessage
 import io
 import base64
 
@@ -30,8 +37,7 @@ def validate_sample_rate(rate: int) -> int:
 
 def validate_language(lang: str) -> str:
     """Validate language code"""
-    valid_langs = ['a', 'b']  # 'a' for American English, 'b' for British English
-    if lang not in valid_langs:
+    if lang not in LANGUAGE_CODES:
         print(f"Warning: Invalid language code '{lang}'. Using 'a' (American English).")
         return 'a'  # Default to American English
     return lang
@@ -42,6 +48,33 @@ DEFAULT_MODEL_PATH = Path('kokoro-v1_0.pth').absolute()
 DEFAULT_OUTPUT_FILE = Path('output.wav').absolute()
 DEFAULT_LANGUAGE = validate_language('a')  # 'a' for American English, 'b' for British English
 DEFAULT_TEXT = "Hello, welcome to this text-to-speech test."
+# Must match STREAM_CHUNK_HEADER in the backend's services/broker.py
+STREAM_CHUNK_HEADER = "x-stream-chunk"
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+|\n+')
+DEFAULT_VOICE = "bf_isabella"
+# Speeds a request can ask for, as offered by get_speed
+MIN_SPEED = 0.5
+MAX_SPEED = 2.0
+# Languages whose pipeline is built and warmed at startup; others are built on first request
+PRELOAD_LANGUAGES = [DEFAULT_LANGUAGE, 'b']
+WARMUP_TEXT = "Hello."
+# Voices loaded at startup; None loads every available voice
+PRELOAD_VOICES = [DEFAULT_VOICE]
+# Single file to memory-map voices from, created from voices/ on first start; None reads each .pt file
+PACKED_VOICES_PATH = None
+# Synthesized sentences kept for reuse, in memory and on disk
+AUDIO_CACHE_DIR = Path('audio_cache').absolute()
+AUDIO_CACHE_MEMORY_BYTES = 256 * 1024 ** 2
+AUDIO_CACHE_DISK_BYTES = 2 * 1024 ** 3
+# How long the idle inference thread waits for other requests to share its first round
+SYNTHESIS_WINDOW = 0.015
+# Output formats a request can ask for: name -> (soundfile format, subtype, content type)
+AUDIO_FORMATS = {
+    'wav': ('WAV', 'PCM_16', 'audio/wav'),
+    'pcm16': ('RAW', 'PCM_16', f'audio/L16; rate={SAMPLE_RATE}; channels=1'),
+    'ogg': ('OGG', 'OPUS', 'audio/ogg'),
+    'mp3': ('MP3', 'MPEG_LAYER_III', 'audio/mpeg'),
+}
 
 # Ensure output directory exists
 DEFAULT_OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -147,9 +180,110 @@ def save_audio_with_retry(audio_data: np.ndarray, sample_rate: int, output_path:
             
     return False
 
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, dropping empty pieces"""
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+def get_pipeline(lang: str):
+    """The pipeline for a language code, built on first use and kept for later requests"""
+    pipeline = pipelines.get(lang)
+    if pipeline is None:
+        with pipelines_lock:
+            pipeline = pipelines.get(lang)
+            if pipeline is None:
+                print(f"Building pipeline for language '{lang}'")
+                pipeline = pipelines[lang] = build_language_pipeline(base_pipeline, lang)
+    return pipeline
+
+def language_for(voice: str) -> str:
+    """Kokoro voice names start with their language code, e.g. 'b' for bf_isabella"""
+    return voice[0] if voice[:1] in LANGUAGE_CODES else DEFAULT_LANGUAGE
+
+def synthesize(text: str, voice: str, lang: str, speed: float) -> Optional[torch.Tensor]:
+    """Generate audio for a short text in one piece, or None if nothing was produced"""
+    segments = [
+        audio if isinstance(audio, torch.Tensor) else torch.from_numpy(audio).float()
+        for _, _, audio in get_pipeline(lang)(text, voice=voice_registry.get(voice), speed=speed, split_pattern=r'\n+')
+        if audio is not None
+    ]
+    if not segments:
+        return None
+    return segments[0] if len(segments) == 1 else torch.cat(segments, dim=0)
+
+def cached_synthesize(text: str, voice: str, lang: str, speed: float) -> Optional[torch.Tensor]:
+    """synthesize, reusing the audio of any earlier request for the same text, voice, language and speed"""
+    key = cache_key(text, voice, lang, speed, SAMPLE_RATE)
+    audio = audio_cache.get(key)
+    if audio is not None:
+        return torch.from_numpy(audio)
+    audio = synthesize(text, voice, lang, speed)
+    if audio is not None:
+        audio_cache.put(key, audio.numpy())
+    return audio
+
+def queue_sentences(request_id: str, sentences: List[str], voice: str, lang: str, speed: float) -> List[asyncio.Future]:
+    """Hand every sentence to the inference thread up front, so it never waits on this request's publishing"""
+    return [synthesis_scheduler.submit(request_id, sentence, voice, lang, speed) for sentence in sentences]
+
+async def speech_segments(text: str, voice: str, lang: str, speed: float):
+    """Like a pipeline call, one (text, phonemes, audio) segment per sentence, served from the cache where possible"""
+    request_id = uuid.uuid4().hex
+    sentences = split_sentences(text)
+    try:
+        for sentence, future in zip(sentences, queue_sentences(request_id, sentences, voice, lang, speed)):
+            yield sentence, None, await future
+    finally:
+        synthesis_scheduler.cancel(request_id)
+    print(f"Audio cache: {audio_cache.stats()}, scheduler: {synthesis_scheduler.stats()}")
+
+def encode_audio(audio: torch.Tensor, audio_format: str) -> bytes:
+    """Encode mono audio in one of AUDIO_FORMATS"""
+    file_format, subtype, _ = AUDIO_FORMATS[audio_format]
+    with io.BytesIO() as buffer:
+        sf.write(buffer, audio.numpy(), SAMPLE_RATE, format=file_format, subtype=subtype)
+        return buffer.getvalue()
+
+async def stream_speech(text: str, voice: str, lang: str, speed: float, audio_format: str, message: RabbitMessage) -> dict:
+    """
+    Synthesize text sentence by sentence and publish each sentence's audio to
+    the caller's reply queue as a raw-bytes message as soon as it is ready.
+    Each chunk carries its sequence number in STREAM_CHUNK_HEADER, so the
+    caller can put chunks back in order and notice a missing one.
+    The returned dict is the final reply that ends the stream.
+    """
+    request_id = uuid.uuid4().hex
+    sentences = split_sentences(text)
+    print(f"Streaming {len(sentences)} sentences")
+    index = 0
+    try:
+        for future in queue_sentences(request_id, sentences, voice, lang, speed):
+            try:
+                audio = await future
+            except Exception as e:
+                print(f"Error generating sentence {index}: {type(e).__name__}: {e}")
+                return {"error": f"Error generating speech: {type(e).__name__}: {e}", "chunks": index}
+            if audio is None:
+                continue
+            # The next sentence is generated while this one is encoded and published
+            await broker.publish(
+                await asyncio.to_thread(encode_audio, audio, audio_format),
+                queue=message.reply_to,
+                correlation_id=message.correlation_id,
+                headers={STREAM_CHUNK_HEADER: str(index)},
+                content_type=AUDIO_FORMATS[audio_format][2],
+            )
+            index += 1
+    finally:
+        synthesis_scheduler.cancel(request_id)
+    torch.cuda.empty_cache()
+    print(f"Audio cache: {audio_cache.stats()}, scheduler: {synthesis_scheduler.stats()}")
+    if index == 0:
+        return {"error": "Error: Failed to generate audio", "chunks": 0}
+    return {"chunks": index, "format": audio_format}
+
 @broker.subscriber("to_tts")
-async def callback(msg):
-    global model, voices_cache
+async def callback(msg, message: RabbitMessage):
+    global voices_cache
     try:
         print("I recived: ", msg)
         text = str(msg['text'])
@@ -165,37 +299,68 @@ async def callback(msg):
                 
         elif choice == "2":
             # Generate speech
-            # Use cached voices if available
-            if voices_cache is None:
-                voices_cache = list_available_voices()
-            
-            if not voices_cache:
+            # Messages can arrive while after_startup is still loading the voices
+            if voice_registry is not None and voice_registry.state == "failed":
+                return {"error": "TTS voices are unavailable: loading them failed", "status": "unavailable"}
+            if voice_registry is None or voice_registry.state == "loading" or synthesis_scheduler is None:
+                print("Voices are still loading")
+                return {"error": "TTS voices are still loading, please try again shortly", "status": "loading"}
+            if not voice_registry.names():
                 print("No voices found! Please check the voices directory.")
                 return {"error": "No voices found! Please check the voices directory."}
             
-            # Get user inputs
-            voice = "bf_isabella" # TODO Make pretty
+            # Get request options, falling back to the worker's defaults
+            voice = str(msg.get('voice') or DEFAULT_VOICE)
             
             # Validate text (don't allow extremely long inputs)
             if len(text) > 10000:  # Reasonable limit for text length
                 print("Text is too long. Please enter a shorter text.")
                 return {"error": "Text is too long. Please enter a shorter text."}
-                
-            speed = 1 # TODO Make pretty
+            
+            try:
+                speed = float(msg['speed']) if msg.get('speed') is not None else 1.0
+            except (TypeError, ValueError):
+                return {"error": f"Invalid speed: {msg.get('speed')}"}
+            if not MIN_SPEED <= speed <= MAX_SPEED:
+                return {"error": f"Speed must be between {MIN_SPEED} and {MAX_SPEED}"}
+            
+            lang = str(msg.get('lang') or language_for(voice))
+            if lang not in LANGUAGE_CODES:
+                return {"error": f"Unsupported language code: {lang}"}
             
             print(f"\nGenerating speech for: '{text}'")
             print(f"Using voice: {voice}")
+            print(f"Language: {lang}")
             print(f"Speed: {speed}x")
             
             # Generate speech
             all_audio = []
-            # Use Path object for consistent path handling
-            voice_path = Path("voices").absolute() / f"{voice}.pt"
             
-            # Verify voice file exists
-            if not voice_path.exists():
-                print(f"Error: Voice file not found: {voice_path}")
-                return {"error": f"Error: Voice file not found: {voice_path}"}
+            # Preloaded voices are a dictionary lookup; any other known voice is loaded once here
+            if voice_registry.get(voice) is None:
+                if voice not in voices_cache:
+                    print(f"Error: Unknown voice: {voice}")
+                    return {"error": f"Error: Unknown voice: {voice}"}
+                if not await asyncio.to_thread(voice_registry.load, [voice], PACKED_VOICES_PATH):
+                    print(f"Error: Voice not loaded: {voice}")
+                    return {"error": f"Error: Voice not loaded: {voice}"}
+            
+            # Building a pipeline loads its G2P frontend; keep that off the inference thread
+            try:
+                await asyncio.to_thread(get_pipeline, lang)
+            except Exception as e:
+                print(f"Error building pipeline for language '{lang}': {e}")
+                return {"error": f"Error building pipeline for language '{lang}': {e}"}
+            
+            # Without a format the reply is base64 WAV inside JSON, as before
+            audio_format = msg.get('format')
+            if audio_format is not None and audio_format not in AUDIO_FORMATS:
+                return {"error": f"Unknown audio format: {audio_format}"}
+            
+            if msg.get('stream'):
+                if not message.reply_to:
+                    return {"error": "Streaming needs a reply queue"}
+                return await stream_speech(text, voice, lang, speed, audio_format or 'wav', message)
             
             # Set a timeout for generation with per-segment timeout
             max_gen_time = 300  # 5 minutes max total
@@ -205,7 +370,6 @@ async def callback(msg):
             
             try:
                 # Setup watchdog timer for overall process
-                import threading
                 generation_complete = False
                 
                 def watchdog_timer():
@@ -220,7 +384,7 @@ async def callback(msg):
                 
                 # Initialize generator
                 try:
-                    generator = model(text, voice=voice_path, speed=speed, split_pattern=r'\n+')
+                    generator = speech_segments(text, voice, lang, speed)
                 except (ValueError, TypeError, RuntimeError) as e:
                     print(f"Error initializing speech generator: {e}")
                     watchdog.cancel()
@@ -232,7 +396,7 @@ async def callback(msg):
                 
                 # Process segments
                 with tqdm(desc="Generating speech") as pbar:
-                    for gs, ps, audio in generator:
+                    async for gs, ps, audio in generator:
                         # Check overall timeout
                         current_time = time.time()
                         if current_time - start_time > max_gen_time:
@@ -259,6 +423,9 @@ async def callback(msg):
                                 print(f"Phonemes: {ps}")
                             pbar.update(1)
                 
+                # Drops any sentences left queued after a timeout
+                await generator.aclose()
+                
                 # Mark generation as complete (for watchdog)
                 generation_complete = True
                 watchdog.cancel()
@@ -293,6 +460,13 @@ async def callback(msg):
                             print(f"Error concatenating audio segments: {e}")
                             return {"error": f"Error concatenating audio segments: {e}"}
                     
+                    if audio_format is not None:
+                        print(f"Sending {audio_format} audio bytes")
+                        return RabbitResponse(
+                            encode_audio(final_audio, audio_format),
+                            content_type=AUDIO_FORMATS[audio_format][2],
+                        )
+                    
                     # Use consistent Path object
                     with io.BytesIO() as wav_buffer:
                         sf.write(wav_buffer, final_audio.numpy(), SAMPLE_RATE, format='WAV')
@@ -318,12 +492,18 @@ async def callback(msg):
     
     torch.cuda.empty_cache()
 
-model = None
+# One pipeline per language code, all sharing base_pipeline's model weights
+base_pipeline = None
+pipelines = {}
+pipelines_lock = threading.Lock()
 voices_cache = None
+audio_cache = AudioCache(AUDIO_CACHE_MEMORY_BYTES, AUDIO_CACHE_DISK_BYTES, AUDIO_CACHE_DIR)
+synthesis_scheduler = None
+voice_registry = None
 
 @app.after_startup
 async def start():
-    global model, voices_cache  # Declare them as global so modifications persist outside the function
+    global base_pipeline, voices_cache, synthesis_scheduler, voice_registry  # Declare them as global so modifications persist outside the function
 
     # Set up device safely
     try:
@@ -333,12 +513,37 @@ async def start():
         device = 'cpu'  # Fallback if CUDA check fails
     print(f"Using device: {device}")
     
+    # Created first, so requests arriving during startup see it loading
+    voice_registry = VoiceRegistry(device)
+    
     # Build model
     print("\nInitializing model...")
     with tqdm(total=1, desc="Building model") as pbar:
-        model = build_model(DEFAULT_MODEL_PATH, device)  # Assign to global model
+        base_pipeline = build_model(DEFAULT_MODEL_PATH, device)  # Assign to global base_pipeline
+        pipelines[base_pipeline.lang_code] = base_pipeline
         pbar.update(1)
     
-    # Cache for voices to avoid redundant calls
-    voices_cache = None
+    # Load voices once so requests only do a dictionary lookup
+    # Cache for voices to avoid redundant calls; set before the registry reports ready
+    voices_cache = set(list_available_voices())
+    try:
+        if PACKED_VOICES_PATH and not os.path.exists(PACKED_VOICES_PATH):
+            print(f"Packing voices into {PACKED_VOICES_PATH}")
+            pack_voices(PACKED_VOICES_PATH)
+        loaded_voices = voice_registry.load(PRELOAD_VOICES, PACKED_VOICES_PATH)
+        print(f"Loaded voices: {', '.join(loaded_voices) or 'none'}")
+    except Exception as e:
+        voice_registry.state = "failed"
+        print(f"Error loading voices: {type(e).__name__}: {e}")
+    
+    # Build each preloaded language's pipeline and run it once, so its first request is not slow
+    for lang in PRELOAD_LANGUAGES:
+        try:
+            synthesize(WARMUP_TEXT, DEFAULT_VOICE, lang, 1.0)
+            print(f"Warmed pipeline for language '{lang}'")
+        except Exception as e:
+            print(f"Warning: Could not warm pipeline for language '{lang}': {e}")
+    
+    # Every request's sentences go through this one thread
+    synthesis_scheduler = SynthesisScheduler(cached_synthesize, SYNTHESIS_WINDOW)
     print("Waiting...")
@@ -5,21 +5,40 @@ from routes.stream import router as stream_router
 from routes.tts import router as tts_router
 from routes.user import router as user_router
 from routes.files import router as files_router
+from routes.stats import router as stats_router
+import asyncio
 import threading
-from services.database import initialize_database
+from contextlib import asynccontextmanager
+from services.storage import get_storage
+from services.agent import get_agent
+from services.broker import get_broker_client
+from services.files import run_audio_sweeper
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    storage = get_storage()
+    await storage.initialize()
+    get_agent()
+    broker = get_broker_client()
+    await broker.start()
+    audio_sweeper = asyncio.create_task(run_audio_sweeper())
+    print("Application startup complete - Database ready")
+    yield
+    audio_sweeper.cancel()
+    await broker.close()
+    await storage.close()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(auth_router)
 app.include_router(chats_router)
 app.include_router(stream_router)
 app.include_router(tts_router)
 app.include_router(user_router)
 app.include_router(files_router)
+app.include_router(stats_router)
 
 thread_local = threading.local()
-initialize_database()
-print("Application startup complete - Database ready")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "*"],
@@ -0,0 +1,185 @@
+"""
+SQLite storage benchmark.
+
+Builds a throwaway database with synthetic users, chats and messages and
+measures:
+
+1. the hot read queries with and without the keyset and lookup indexes;
+2. reader latency and writer throughput while streams write messages,
+   with the DATABASE_PRAGMAS profile (WAL) against the default rollback
+   journal, both through the pool and the serialized writer path.
+
+Usage: python benchmarks/database_benchmark.py [--messages 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.database as database
+from constants import DATABASE_PRAGMAS
+from services.sqlite_storage import SQLiteStorage
+
+# Indexes the hot queries rely on, and how to rebuild them after the unindexed run
+INDEXES = {
+    "idx_messages_chat_id": "CREATE INDEX idx_messages_chat_id ON messages (chat_id, id)",
+    "idx_chats_user_id": "CREATE INDEX idx_chats_user_id ON chats (user_id, id)",
+    "idx_messages_image": "CREATE INDEX idx_messages_image ON messages (image_id, chat_id) WHERE image_id IS NOT NULL",
+}
+# The pre-WAL defaults: rollback journal, full sync
+ROLLBACK_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000}
+
+def use_database(path: str, pragmas: dict):
+    """Point services.database at path with a fresh pool using pragmas"""
+    database.close_database_pool()
+    database.DATABASE_DIR = os.path.dirname(path)
+    database.DATABASE_PATH = path
+    database.DATABASE_PRAGMAS = pragmas
+    database._pool = None
+
+def populate(users: int, chats: int, messages: int):
+    """Insert synthetic rows in bulk on the writer connection"""
+    rng = random.Random(0)
+    with database.get_db_write_connection_service() as db:
+        db.executemany(
+            "INSERT INTO users (email, password_hash, is_temporary_password) VALUES (?, 'x', FALSE)",
+            ((f"user{i}@example.com",) for i in range(users)),
+        )
+        db.executemany(
+            "INSERT INTO chats (user_id, title) VALUES (?, ?)",
+            ((rng.randint(2, users + 1), f"Chat {i}") for i in range(chats)),
+        )
+        db.executemany(
+            "INSERT INTO messages (chat_id, content, is_human, image_id) VALUES (?, ?, ?, ?)",
+            (
+                (rng.randint(1, chats), f"message {i} " + "lorem ipsum " * 4, i % 2 == 0,
+                 f"image-{i}" if i % 1000 == 0 else None)
+                for i in range(messages)
+            ),
+        )
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        db.executemany(
+            "INSERT INTO password_reset_tokens (user_id, token, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            ((2 + i % users, f"token-{i}", expires_at, datetime.utcnow()) for i in range(users)),
+        )
+        db.execute("ANALYZE")
+
+async def time_call(func, *args, repeat: int = 50) -> float:
+    """Median milliseconds of awaiting func(*args)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def hot_queries(storage: SQLiteStorage, users: int, chats: int) -> dict:
+    rng = random.Random(1)
+    chat_id = rng.randint(1, chats)
+    user_id = rng.randint(2, users + 1)
+    return {
+        "messages page": await time_call(storage.list_messages, chat_id, None, None, 50),
+        "recent messages": await time_call(storage.get_recent_messages, chat_id, 20),
+        "last AI message": await time_call(storage.get_last_ai_message, chat_id),
+        "chats page": await time_call(storage.list_chats, user_id, None, None, 50),
+        "image ownership": await time_call(storage.user_owns_image, "image-1000", user_id),
+        "reset token": await time_call(storage.get_reset_token, "token-7"),
+    }
+
+def set_indexes(enabled: bool):
+    with database.get_db_write_connection_service() as db:
+        for name, statement in INDEXES.items():
+            db.execute(f"DROP INDEX IF EXISTS {name}")
+            if enabled:
+                db.execute(statement)
+        db.execute("ANALYZE")
+
+async def concurrent_streams(storage: SQLiteStorage, chats: int, seconds: float, writers: int, readers: int) -> dict:
+    """Writers add messages like finishing streams while readers page through chats"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    read_latencies = []
+    writes = 0
+    errors = 0
+
+    async def writer(n: int):
+        nonlocal writes, errors
+        rng = random.Random(n)
+        while loop.time() < deadline:
+            try:
+                await storage.add_message(rng.randint(1, chats), "answer " * 200, False)
+                writes += 1
+            except Exception:
+                errors += 1
+
+    async def reader(n: int):
+        rng = random.Random(100 + n)
+        while loop.time() < deadline:
+            start = time.perf_counter()
+            await storage.list_messages(rng.randint(1, chats), None, None, 50)
+            read_latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(writer(n) for n in range(writers)), *(reader(n) for n in range(readers)))
+    read_latencies.sort()
+    return {
+        "writes/s": writes / seconds,
+        "write errors": errors,
+        "reads/s": len(read_latencies) / seconds,
+        "read p50 ms": read_latencies[len(read_latencies) // 2],
+        "read p99 ms": read_latencies[int(len(read_latencies) * 0.99)],
+    }
+
+def print_table(title: str, columns: list, rows: dict):
+    print(f"\n{title}")
+    print(f"  {'':20s}" + "".join(f"{column:>18s}" for column in columns))
+    for name, values in rows.items():
+        print(f"  {name:20s}" + "".join(f"{value:18.2f}" for value in values))
+
+async def main(args):
+    storage = SQLiteStorage()
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(os.path.join(directory, "bench.db"), DATABASE_PRAGMAS)
+        await storage.initialize()
+        start = time.perf_counter()
+        await database.run_db(populate, args.users, args.chats, args.messages)
+        print(f"Inserted {args.messages} messages, {args.chats} chats, {args.users} users "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        indexed = await hot_queries(storage, args.users, args.chats)
+        await database.run_db(set_indexes, False)
+        unindexed = await hot_queries(storage, args.users, args.chats)
+        await database.run_db(set_indexes, True)
+        print_table("Hot queries, median ms", ["no index", "indexed"], {
+            name: (unindexed[name], indexed[name]) for name in indexed
+        })
+
+        results = {}
+        for label, pragmas in (("rollback journal", ROLLBACK_PRAGMAS), ("WAL profile", DATABASE_PRAGMAS)):
+            await storage.close()
+            use_database(os.path.join(directory, "bench.db"), pragmas)
+            results[label] = await concurrent_streams(
+                storage, args.chats, args.seconds, args.writers, args.readers
+            )
+        print_table(
+            f"{args.writers} writers and {args.readers} readers for {args.seconds:.0f}s",
+            list(results),
+            {metric: [result[metric] for result in results.values()] for metric in results["WAL profile"]},
+        )
+        await storage.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
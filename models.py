@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 
 class UserCreate(BaseModel):
@@ -34,6 +34,14 @@ class MessageResponse(BaseModel):
     image_id: Optional[str]
     created_at: str
 
+class ChatPage(BaseModel):
+    items: List[ChatResponse]
+    next_cursor: Optional[int] = None
+
+class MessagePage(BaseModel):
+    items: List[MessageResponse]
+    next_cursor: Optional[int] = None
+
 class StreamRequest(BaseModel):
     question: str
     chat_id: Optional[int] = None
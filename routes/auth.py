@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models import UserLogin, TokenResponse, PasswordChange
 from services.auth import (
@@ -9,18 +9,19 @@ from services.auth import (
     get_user_by_email_service,
     validate_admin_user_service
 )
+from services.rate_limit import check_login_rate_limit_service, client_address
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 security = HTTPBearer()
 
-def get_current_user_dependency(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def get_current_user_dependency(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """
     Dependency to get current user from JWT token.
     This replaces the old get_current_user_service dependency.
     """
     token = credentials.credentials
     email = verify_token_service(token)
-    user = get_user_by_email_service(email)
+    user = await get_user_by_email_service(email)
     return user
 
 def get_admin_user_dependency(current_user: dict = Depends(get_current_user_dependency)) -> dict:
@@ -29,11 +30,18 @@ def get_admin_user_dependency(current_user: dict = Depends(get_current_user_depe
     """
     return validate_admin_user_service(current_user)
 
-@router.post("/login", response_model=TokenResponse)
+async def login_rate_limit_dependency(request: Request):
+    """
+    Dependency that rejects addresses making too many login or
+    password-change attempts, before any password is hashed.
+    """
+    await check_login_rate_limit_service(client_address(request))
+
+@router.post("/login", response_model=TokenResponse, dependencies=[Depends(login_rate_limit_dependency)])
 async def login_route(user_login: UserLogin):
     return await login_service(user_login)
 
-@router.post("/change-password")
+@router.post("/change-password", dependencies=[Depends(login_rate_limit_dependency)])
 async def change_password_route(password_change: PasswordChange):
     return await change_password_service(password_change)
 
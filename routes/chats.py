@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
-from models import ChatResponse, ChatCreate, MessageResponse
+from fastapi import APIRouter, Depends, Query
+from models import ChatResponse, ChatCreate, MessageResponse, ChatPage, MessagePage
 from services.chats import create_new_chat_service, get_chats_service, get_messages_service, delete_chat_service, get_last_message_service
 from routes.auth import get_current_user_dependency
-from typing import List
+from typing import Optional
+from constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/api/chats", tags=["chats"])
 
@@ -10,13 +11,24 @@ router = APIRouter(prefix="/api/chats", tags=["chats"])
 async def create_new_chat_route(chat_create: ChatCreate, current_user: dict = Depends(get_current_user_dependency)):
     return await create_new_chat_service(chat_create, current_user)
 
-@router.get("/", response_model=List[ChatResponse])
-async def get_chats_route(current_user: dict = Depends(get_current_user_dependency)):
-    return await get_chats_service(current_user)
+@router.get("/", response_model=ChatPage)
+async def get_chats_route(
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user_dependency)
+):
+    return await get_chats_service(current_user, before_id, after_id, limit)
 
-@router.get("/{chat_id}/messages", response_model=List[MessageResponse])
-async def get_messages_route(chat_id: int, current_user: dict = Depends(get_current_user_dependency)):
-    return await get_messages_service(chat_id, current_user)
+@router.get("/{chat_id}/messages", response_model=MessagePage)
+async def get_messages_route(
+    chat_id: int,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_current_user_dependency)
+):
+    return await get_messages_service(chat_id, current_user, before_id, after_id, limit)
 
 @router.delete("/{chat_id}")
 async def delete_chat_route(chat_id: int, current_user: dict = Depends(get_current_user_dependency)):
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Depends
+from services.stats import get_stats_service
+from routes.auth import get_admin_user_dependency
+
+router = APIRouter(prefix="/api/admin/stats", tags=["stats"])
+
+@router.get("/")
+async def get_stats_route(admin_user: dict = Depends(get_admin_user_dependency)):
+    return await get_stats_service(admin_user)
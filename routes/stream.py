@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from models import StreamRequest
 from services.stream import stream_response_service
+from services.rate_limit import check_stream_rate_limit_service, client_address
 from routes.auth import get_current_user_dependency
 
 router = APIRouter(prefix="/stream", tags=["stream"])
 
+async def stream_rate_limit_dependency(
+    request: Request,
+    current_user: dict = Depends(get_current_user_dependency),
+) -> dict:
+    """
+    Dependency that rejects users and addresses that start streams too quickly.
+    """
+    await check_stream_rate_limit_service(current_user, client_address(request))
+    return current_user
+
 @router.post("/")
-async def stream_response_route(request: StreamRequest, current_user: dict = Depends(get_current_user_dependency)):
+async def stream_response_route(request: StreamRequest, current_user: dict = Depends(stream_rate_limit_dependency)):
     return await stream_response_service(request, current_user)
\ No newline at end of file
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
 from services.tts import tts_service
 from routes.auth import get_current_user_dependency
 
 router = APIRouter(prefix="/tts", tags=["tts"])
 
 @router.get("/")
-async def tts_route(text: str, current_user: dict = Depends(get_current_user_dependency)):
-    return await tts_service(text, current_user)
\ No newline at end of file
+async def tts_route(
+    text: str,
+    voice: Optional[str] = None,
+    speed: Optional[float] = Query(None, ge=0.5, le=2.0),
+    lang: Optional[str] = Query(None, min_length=1, max_length=1),
+    audio_format: Optional[str] = Query(None, alias="format"),
+    current_user: dict = Depends(get_current_user_dependency),
+):
+    return await tts_service(text, current_user, voice, speed, lang, audio_format)
\ No newline at end of file
@@ -1,6 +1,71 @@
 from services.tools import send_email_tool, image_generation_tool, repl_tool
 from langchain.agents import AgentType, initialize_agent, load_tools
+from langchain_core.callbacks import BaseCallbackHandler
 from dependencies import llm
+from constants import LLM_CONCURRENCY
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from services.llm_state import get_llm_state_cache
+from typing import AsyncIterator, Callable, Optional
+import asyncio
+import threading
+import time
+
+# One thread per model slot. If a client disconnects and its scheduler slot
+# is released while a step is still running, the next agent run queues here
+# until the abandoned one reaches a step boundary and stops.
+_agent_executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="agent")
+
+_STEP, _TOKEN, _ERROR, _DONE = range(4)
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+# Output AgentExecutor gives when it stops at its iteration or time limit without an answer
+AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+class FinalAnswerTokenHandler(BaseCallbackHandler):
+    """
+    Pass on only the tokens an LLM call writes after "Final Answer:",
+    dropping the ReAct thoughts, actions and tool inputs before it.
+    """
+
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+        self._buffer = ""
+        self._answering = False
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._buffer = ""
+        self._answering = False
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self._answering:
+            self.on_token(token)
+            return
+        self._buffer += token
+        marker_at = self._buffer.find(FINAL_ANSWER_MARKER)
+        if marker_at != -1:
+            self._answering = True
+            answer_start = self._buffer[marker_at + len(FINAL_ANSWER_MARKER):].lstrip()
+            if answer_start:
+                self.on_token(answer_start)
+
+class PrefillTimerHandler(BaseCallbackHandler):
+    """Time prompt evaluation: from the start of each LLM call to its first token"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self._started_at = None
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._started_at = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self._started_at is None:
+            return
+        elapsed = time.perf_counter() - self._started_at
+        self._started_at = None
+        get_llm_state_cache().record_prefill(elapsed)
+        print(f"Prefill took {elapsed * 1000:.0f} ms{self.label}")
 
 def create_agent_with_tools():
     """Create agent with tools"""
@@ -21,4 +86,73 @@ def create_agent_with_tools():
         agent_kwargs={
             "prefix": system_prompt + "\n\nYou have access to the following tools:"
         }
-    )
\ No newline at end of file
+    )
+
+@lru_cache(maxsize=1)
+def get_agent():
+    """
+    Shared agent executor, built on first use. It holds no per-request
+    state: history is folded into the agent input and callbacks are
+    passed to agent.iter, so every request can reuse it.
+    """
+    return create_agent_with_tools()
+
+async def run_on_model(func, *args):
+    """Run blocking model work on the agent executor, serialized with agent runs"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_agent_executor, func, *args)
+
+async def iterate_agent(agent, agent_input, stream_tokens: bool = False, state_key: Optional[int] = None) -> AsyncIterator[dict]:
+    """
+    Run agent.iter on the agent executor and yield its steps on the event
+    loop, so a long generation never blocks other requests. Closing the
+    iterator stops the agent at its next step boundary.
+    With stream_tokens, final-answer tokens are yielded as {"token": text}
+    while the model is still generating. With state_key (a chat id), the
+    model state saved after that chat's previous run is restored first, so
+    only the new part of the prompt is evaluated.
+    """
+    loop = asyncio.get_running_loop()
+    steps = asyncio.Queue()
+    stop = threading.Event()
+    callbacks = [PrefillTimerHandler(f" (chat {state_key})" if state_key is not None else "")]
+    if stream_tokens:
+        callbacks.append(FinalAnswerTokenHandler(
+            lambda token: loop.call_soon_threadsafe(steps.put_nowait, (_TOKEN, token))
+        ))
+    
+    def produce():
+        state_cache = get_llm_state_cache()
+        try:
+            if state_key is not None:
+                state_cache.restore(llm.client, state_key)
+            for step in agent.iter(agent_input, callbacks=callbacks):
+                loop.call_soon_threadsafe(steps.put_nowait, (_STEP, step))
+                if stop.is_set():
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(steps.put_nowait, (_ERROR, e))
+            return
+        finally:
+            loop.call_soon_threadsafe(steps.put_nowait, (_DONE, None))
+        # Saved after the answer is handed over; the next run queues behind this on the same executor
+        if state_key is not None:
+            try:
+                state_cache.save(llm.client, state_key)
+            except Exception as e:
+                print(f"Saving model state for chat {state_key} failed: {e}")
+    
+    loop.run_in_executor(_agent_executor, produce)
+    try:
+        while True:
+            kind, value = await steps.get()
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise value
+            if kind == _TOKEN:
+                yield {"token": value}
+            else:
+                yield value
+    finally:
+        stop.set()
@@ -2,14 +2,35 @@ from fastapi import HTTPException, status
 import jwt
 from datetime import timedelta
 from models import UserLogin, PasswordChange
-from constants import ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
+from constants import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM,
+    USER_CACHE_SIZE, USER_CACHE_TTL, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
+)
 import hashlib
+import time
 from typing import Optional
 from datetime import datetime, timedelta
-from services.database import get_db_connection_service
+from services.cache import TTLCache
+from services.passwords import hash_password, verify_password, needs_rehash
+from services.storage import get_storage
 import string
 import secrets
 
+# email -> user row
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+# sha256(token) -> email, kept until the token's exp
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+def invalidate_user_cache(email: str):
+    """Drop a cached user after their row changes"""
+    user_cache.pop(email)
+
+def get_auth_cache_stats() -> dict:
+    return {
+        "user_cache": user_cache.stats(),
+        "token_cache": token_cache.stats(),
+    }
+
 def generate_reset_token():
     """Generate a secure random reset token"""
     return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
@@ -18,14 +39,16 @@ def generate_temporary_password(length=12):
     characters = string.ascii_letters + string.digits
     return ''.join(secrets.choice(characters) for _ in range(length))
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def verify_token_service(token: str) -> str:
     """
     Verify JWT token and return email.
     Pure service function that takes token as parameter.
     """
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    email = token_cache.get(token_key)
+    if email is not None:
+        return email
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -35,6 +58,10 @@ def verify_token_service(token: str) -> str:
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        exp = payload.get("exp")
+        ttl = exp - time.time() if exp is not None else None
+        if ttl is None or ttl > 0:
+            token_cache.set(token_key, email, ttl=ttl)
         return email
     except jwt.PyJWTError:
         raise HTTPException(
@@ -43,34 +70,36 @@ def verify_token_service(token: str) -> str:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-def get_user_by_email_service(email: str) -> dict:
+async def get_user_by_email_service(email: str) -> dict:
     """
     Get user by email from database.
     Pure service function that takes email as parameter.
     """
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT * FROM users WHERE email = ?', (email,))
-    user = c.fetchone()
+    user = user_cache.get(email)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
-        )
+        user = await get_storage().get_user_by_email(email)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        user_cache.set(email, user)
     return dict(user)
 
 async def login_service(user_login: UserLogin):
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT * FROM users WHERE email = ?', (user_login.email,))
-    user = c.fetchone()
+    storage = get_storage()
+    user = await storage.get_user_by_email(user_login.email)
     
-    if not user or hash_password(user_login.password) != user['password_hash']:
+    if not user or not await verify_password(user_login.password, user['password_hash']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    if needs_rehash(user['password_hash']):
+        await storage.update_password_hash(user['id'], await hash_password(user_login.password))
+        invalidate_user_cache(user['email'])
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user['email']}, expires_delta=access_token_expires
@@ -79,10 +108,8 @@ async def login_service(user_login: UserLogin):
     return {"access_token": access_token, "token_type": "bearer"}
 
 async def change_password_service(password_change: PasswordChange):
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT * FROM users WHERE email = ?', (password_change.email,))
-    user = c.fetchone()
+    storage = get_storage()
+    user = await storage.get_user_by_email(password_change.email)
     
     if not user:
         raise HTTPException(
@@ -90,19 +117,15 @@ async def change_password_service(password_change: PasswordChange):
             detail="User not found"
         )
     
-    if hash_password(password_change.old_password) != user['password_hash']:
+    if not await verify_password(password_change.old_password, user['password_hash']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Current password is incorrect"
         )
     
-    new_password_hash = hash_password(password_change.new_password)
-    c.execute('''
-        UPDATE users 
-        SET password_hash = ?, is_temporary_password = FALSE 
-        WHERE email = ?
-    ''', (new_password_hash, password_change.email))
-    db.commit()
+    new_password_hash = await hash_password(password_change.new_password)
+    await storage.update_password(user['id'], new_password_hash)
+    invalidate_user_cache(user['email'])
     
     return {"message": "Password changed successfully"}
 
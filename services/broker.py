@@ -0,0 +1,205 @@
+"""
+Long-lived RabbitMQ client for RPC calls to the TTS and image workers.
+
+One connection is opened in the app lifespan and kept for the life of the
+process. Replies come back on a single exclusive reply queue and are
+matched to callers by correlation id, so any number of RPC calls can be in
+flight at once over the same connection. Workers can also answer with a
+series of chunks before their final reply; see BrokerClient.stream.
+"""
+import asyncio
+import uuid
+from typing import Any, AsyncIterator, Optional
+from faststream.rabbit import RabbitBroker, RabbitQueue
+from faststream.rabbit.annotations import RabbitMessage
+from constants import (
+    RABBITMQ_URL,
+    BROKER_RPC_TIMEOUT,
+    BROKER_RECONNECT_MIN_DELAY,
+    BROKER_RECONNECT_MAX_DELAY,
+    BROKER_CONNECT_WAIT,
+    BROKER_STREAM_GAP_WAIT,
+)
+
+# Header workers set on replies that are chunks of a streamed answer; its
+# value is the chunk's sequence number, counting from 0
+STREAM_CHUNK_HEADER = "x-stream-chunk"
+
+class BrokerUnavailable(Exception):
+    pass
+
+class BrokerClient:
+    def __init__(self, broker: RabbitBroker):
+        self.broker = broker
+        self.reply_queue = f"lumen.replies.{uuid.uuid4().hex}"
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending = {}
+        self._connected = asyncio.Event()
+        self._connect_task: Optional[asyncio.Task] = None
+        self.calls = 0
+        self.timeouts = 0
+        self.late_replies = 0
+        self.reconnects = 0
+
+        @broker.subscriber(RabbitQueue(self.reply_queue, exclusive=True, auto_delete=True))
+        async def on_reply(body: Any, message: RabbitMessage):
+            target = self._pending.get(message.correlation_id)
+            if isinstance(target, asyncio.Queue):
+                sequence = (message.headers or {}).get(STREAM_CHUNK_HEADER)
+                target.put_nowait((None if sequence is None else int(sequence), body))
+                return
+            future = self._pending.pop(message.correlation_id, None)
+            if future is None or future.done():
+                # The caller already timed out
+                self.late_replies += 1
+                return
+            future.set_result(body)
+
+    async def start(self):
+        """Connect in the background, retrying with backoff until RabbitMQ is reachable"""
+        self.loop = asyncio.get_running_loop()
+        self._connect_task = asyncio.create_task(self._connect())
+
+    async def _connect(self):
+        delay = BROKER_RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self.broker.start()
+                break
+            except Exception as e:
+                self.reconnects += 1
+                print(f"RabbitMQ connection failed: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, BROKER_RECONNECT_MAX_DELAY)
+        self._connected.set()
+        print("Connected to RabbitMQ")
+
+    async def close(self):
+        if self._connect_task is not None:
+            self._connect_task.cancel()
+        for target in self._pending.values():
+            if isinstance(target, asyncio.Future):
+                target.cancel()
+        self._pending.clear()
+        await self.broker.close()
+
+    async def rpc(self, queue: str, payload: Any, timeout: float = BROKER_RPC_TIMEOUT) -> Any:
+        """
+        Publish payload to queue and wait for the worker's reply.
+        Raises BrokerUnavailable if RabbitMQ is not connected within
+        BROKER_CONNECT_WAIT and TimeoutError if no reply arrives within
+        timeout seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        await self._wait_connected(min(timeout, BROKER_CONNECT_WAIT))
+
+        correlation_id = uuid.uuid4().hex
+        future = loop.create_future()
+        self._pending[correlation_id] = future
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(
+                self._publish_and_wait(queue, payload, correlation_id, future),
+                max(0, deadline - loop.time()),
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self._pending.pop(correlation_id, None)
+
+    async def stream(self, queue: str, payload: Any, timeout: float = BROKER_RPC_TIMEOUT) -> AsyncIterator[Any]:
+        """
+        Publish payload to queue and yield each chunk the worker sends back,
+        in sequence order, until its final reply. Chunks that arrive early
+        are held until the ones before them come in. timeout bounds the wait
+        for every chunk; a final reply carrying an error, or a chunk still
+        missing BROKER_STREAM_GAP_WAIT after the final reply, raises
+        RuntimeError.
+        """
+        await self._wait_connected(min(timeout, BROKER_CONNECT_WAIT))
+        correlation_id = uuid.uuid4().hex
+        replies = asyncio.Queue()
+        self._pending[correlation_id] = replies
+        self.calls += 1
+        try:
+            await self.broker.publish(
+                payload,
+                queue=queue,
+                reply_to=self.reply_queue,
+                correlation_id=correlation_id,
+            )
+            expected = 0
+            early = {}
+            total = None
+            while total is None or expected < total:
+                try:
+                    sequence, body = await asyncio.wait_for(
+                        replies.get(), timeout if total is None else BROKER_STREAM_GAP_WAIT
+                    )
+                except asyncio.TimeoutError:
+                    if total is not None:
+                        raise RuntimeError(f"Stream chunk {expected} of {total} never arrived") from None
+                    self.timeouts += 1
+                    raise
+                if sequence is None:
+                    if isinstance(body, dict) and body.get("error"):
+                        raise RuntimeError(body["error"])
+                    # The final reply counts the chunks; without a count, trust the highest one seen
+                    total = body.get("chunks") if isinstance(body, dict) else None
+                    if total is None:
+                        total = max(early, default=expected - 1) + 1
+                    continue
+                if sequence < expected:
+                    # Redelivered
+                    continue
+                early[sequence] = body
+                while expected in early:
+                    yield early.pop(expected)
+                    expected += 1
+        finally:
+            self._pending.pop(correlation_id, None)
+
+    async def _wait_connected(self, timeout: float):
+        """Fail fast while RabbitMQ is down, allowing only a short wait for a connection in progress"""
+        if self._connected.is_set():
+            return
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise BrokerUnavailable("RabbitMQ is not reachable") from None
+
+    async def _publish_and_wait(self, queue: str, payload: Any, correlation_id: str, future: asyncio.Future) -> Any:
+        await self.broker.publish(
+            payload,
+            queue=queue,
+            reply_to=self.reply_queue,
+            correlation_id=correlation_id,
+        )
+        return await future
+
+    def rpc_from_thread(self, queue: str, payload: Any, timeout: float = BROKER_RPC_TIMEOUT) -> Any:
+        """rpc for code running on worker threads, such as agent tools"""
+        if self.loop is None:
+            raise BrokerUnavailable("The broker client has not been started")
+        future = asyncio.run_coroutine_threadsafe(self.rpc(queue, payload, timeout), self.loop)
+        return future.result()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._connected.is_set(),
+            "in_flight": len(self._pending),
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "late_replies": self.late_replies,
+            "connect_retries": self.reconnects,
+        }
+
+_client = None
+
+def get_broker_client() -> BrokerClient:
+    global _client
+    if _client is None:
+        _client = BrokerClient(RabbitBroker(RABBITMQ_URL))
+    return _client
@@ -1,124 +1,104 @@
 from models import ChatCreate
-from services.database import get_db_connection_service
-from typing import List
+from services.storage import get_storage
+from services.llm_state import get_llm_state_cache
+from typing import Optional
 from fastapi import HTTPException, status
+from constants import DEFAULT_PAGE_SIZE
 
-def add_message(chat_id: int, content: str, is_human: bool, image_id: str = None):
+async def add_message(chat_id: int, content: str, is_human: bool, image_id: str = None) -> int:
     """Add a message to a chat"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('''
-        INSERT INTO messages (chat_id, content, is_human, image_id) 
-        VALUES (?, ?, ?, ?)
-    ''', (chat_id, content, is_human, image_id))
-    db.commit()
+    return await get_storage().add_message(chat_id, content, is_human, image_id)
 
-def get_chat_history_for_memory(chat_id: int, limit: int = 10) -> List[dict]:
-    """Get recent messages for memory context"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('''
-        SELECT content, is_human 
-        FROM messages 
-        WHERE chat_id = ? 
-        ORDER BY created_at DESC 
-        LIMIT ?
-    ''', (chat_id, limit))
-    messages = c.fetchall()
-    return [dict(msg) for msg in reversed(messages)]
-
-def delete_chat(chat_id: int, user_id: int):
-    """Delete a chat and all its messages"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT id FROM chats WHERE id = ? AND user_id = ?', (chat_id, user_id))
-    if not c.fetchone():
+async def delete_chat(chat_id: int, user_id: int):
+    """Delete a chat, all its messages and its audio"""
+    if not await get_storage().delete_chat(chat_id, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found"
         )
-    
-    c.execute('DELETE FROM chats WHERE id = ?', (chat_id,))
-    db.commit()
+    get_llm_state_cache().discard(chat_id)
 
-def get_chat_messages(chat_id: int, user_id: int) -> List[dict]:
-    """Get all messages for a specific chat (with user validation)"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT id FROM chats WHERE id = ? AND user_id = ?', (chat_id, user_id))
-    if not c.fetchone():
+async def _ensure_chat_owner(chat_id: int, user_id: int):
+    if not await get_storage().user_owns_chat(chat_id, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found"
         )
+
+def _validate_cursors(before_id: Optional[int], after_id: Optional[int]):
+    if before_id is not None and after_id is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either before_id or after_id, not both"
+        )
+
+async def get_chat_messages(chat_id: int, user_id: int, before_id: Optional[int] = None,
+                            after_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    Get one page of messages for a specific chat (with user validation).
+    Messages are returned oldest first. Without a cursor the latest page is
+    returned and next_cursor is the before_id for the previous page; with
+    after_id, next_cursor is the after_id for the following page.
+    """
+    _validate_cursors(before_id, after_id)
+    await _ensure_chat_owner(chat_id, user_id)
     
-    c.execute('''
-        SELECT id, chat_id, content, is_human, image_id, created_at 
-        FROM messages 
-        WHERE chat_id = ? 
-        ORDER BY created_at ASC
-    ''', (chat_id,))
-    return [dict(row) for row in c.fetchall()]
+    rows = await get_storage().list_messages(chat_id, before_id, after_id, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = rows if after_id is not None else list(reversed(rows))
+    
+    next_cursor = None
+    if has_more and items:
+        next_cursor = items[-1]['id'] if after_id is not None else items[0]['id']
+    return {"items": items, "next_cursor": next_cursor}
 
-def create_chat(user_id: int, title: str) -> int:
+async def create_chat(user_id: int, title: str) -> int:
     """Create a new chat and return its ID"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('INSERT INTO chats (user_id, title) VALUES (?, ?)', (user_id, title))
-    db.commit()
-    return c.lastrowid
+    return await get_storage().create_chat(user_id, title)
+
+async def get_user_chats(user_id: int, before_id: Optional[int] = None,
+                         after_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    Get one page of chats for a user, newest first.
+    next_cursor is the before_id for older chats, or with after_id the
+    after_id for newer ones.
+    """
+    _validate_cursors(before_id, after_id)
+    rows = await get_storage().list_chats(user_id, before_id, after_id, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = list(reversed(rows)) if after_id is not None else rows
+    
+    next_cursor = None
+    if has_more and items:
+        next_cursor = items[0]['id'] if after_id is not None else items[-1]['id']
+    return {"items": items, "next_cursor": next_cursor}
 
-def get_user_chats(user_id: int) -> List[dict]:
-    """Get all chats for a user"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('''
-        SELECT id, title, created_at, user_id 
-        FROM chats 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC
-    ''', (user_id,))
-    return [dict(row) for row in c.fetchall()]
+async def user_owns_chat(chat_id: int, user_id: int) -> bool:
+    """Check whether a chat exists and belongs to the user"""
+    return await get_storage().user_owns_chat(chat_id, user_id)
 
 async def create_new_chat_service(chat_create: ChatCreate, current_user: dict):
-    chat_id = create_chat(current_user['id'], chat_create.title)
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT id, title, created_at, user_id FROM chats WHERE id = ?', (chat_id,))
-    chat = dict(c.fetchone())
+    chat_id = await create_chat(current_user['id'], chat_create.title)
+    chat = await get_storage().get_chat(chat_id)
     return chat
 
-async def get_chats_service(current_user: dict):
-    chats = get_user_chats(current_user['id'])
+async def get_chats_service(current_user: dict, before_id: Optional[int] = None,
+                            after_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+    chats = await get_user_chats(current_user['id'], before_id, after_id, limit)
     return chats
 
-async def get_messages_service(chat_id: int, current_user: dict):
-    messages = get_chat_messages(chat_id, current_user['id'])
+async def get_messages_service(chat_id: int, current_user: dict, before_id: Optional[int] = None,
+                               after_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE):
+    messages = await get_chat_messages(chat_id, current_user['id'], before_id, after_id, limit)
     return messages
 
 async def delete_chat_service(chat_id: int, current_user: dict):
-    delete_chat(chat_id, current_user['id'])
+    await delete_chat(chat_id, current_user['id'])
     return {"message": "Chat deleted successfully"}
 
 async def get_last_message_service(chat_id: int, current_user: dict):
     """Get the last AI (is_human = false) message for a specific chat (with user validation)"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    
-    c.execute('SELECT id FROM chats WHERE id = ? AND user_id = ?', (chat_id, current_user['id']))
-    if not c.fetchone():
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat not found"
-        )
-    
-    c.execute('''
-        SELECT id, chat_id, content, is_human, image_id, created_at 
-        FROM messages 
-        WHERE chat_id = ? AND is_human = 0
-        ORDER BY created_at DESC
-        LIMIT 1
-    ''', (chat_id,))
-    
-    row = c.fetchone()
-    return dict(row) if row else None
+    await _ensure_chat_owner(chat_id, current_user['id'])
+    return await get_storage().get_last_ai_message(chat_id)
@@ -1,73 +1,221 @@
-import hashlib
-from constants import DATABASE_PATH, DATABASE_DIR
+from constants import DATABASE_PATH, DATABASE_DIR, DATABASE_POOL_SIZE, DATABASE_POOL_TIMEOUT, DATABASE_WRITE_TIMEOUT, DATABASE_PRAGMAS
 import sqlite3
 import os
+import queue
+import threading
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fastapi import HTTPException, status
 from constants import ADMIN_EMAIL, ADMIN_PASSWORD
+from services.migrations import run_migrations
+from services.passwords import hash_password_sync
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections"""
+
+    def __init__(self, database_path: str, size: int, timeout: float, pragmas: dict = None, write_timeout: float = 30.0):
+        self.database_path = database_path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        self.write_timeout = write_timeout
+        self._write_lock = threading.Lock()
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_hold = 0.0
+        self._max_hold = 0.0
+        self._writes = 0
+        self._write_waiting = 0
+        self._total_write_wait = 0.0
+        self._max_write_wait = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        busy_timeout = self.pragmas.get("busy_timeout", 5000) / 1000
+        conn = sqlite3.connect(self.database_path, timeout=busy_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection, opening a new one while below the pool size"""
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._waiting += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Database is busy, please try again"
+                    )
+                finally:
+                    with self._lock:
+                        self._waiting -= 1
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    def release(self, conn: sqlite3.Connection, held_for: float = 0.0):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+
+        with self._lock:
+            self._in_use -= 1
+            self._total_hold += held_for
+            self._max_hold = max(self._max_hold, held_for)
+            if conn is None:
+                self._created -= 1
+
+        if conn is not None:
+            self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        start = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            self.release(conn, time.perf_counter() - start)
+
+    @contextmanager
+    def write_connection(self):
+        """
+        Check out a connection on the single serialized writer path.
+        Holds an immediate transaction that is committed when the block exits
+        cleanly and rolled back if it raises.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._write_waiting += 1
+        acquired = self._write_lock.acquire(timeout=self.write_timeout)
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._write_waiting -= 1
+            if acquired:
+                self._writes += 1
+                self._total_write_wait += wait
+                self._max_write_wait = max(self._max_write_wait, wait)
+            else:
+                self._timeouts += 1
+        if not acquired:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database is busy, please try again"
+            )
+
+        try:
+            with self.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.rollback()
+                    raise
+                if conn.in_transaction:
+                    conn.commit()
+        finally:
+            self._write_lock.release()
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "pool_size": self.size,
+                "connections": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "waiting": self._waiting,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": (self._total_wait / checkouts * 1000) if checkouts else 0.0,
+                "max_wait_ms": self._max_wait * 1000,
+                "avg_checkout_ms": (self._total_hold / checkouts * 1000) if checkouts else 0.0,
+                "max_checkout_ms": self._max_hold * 1000,
+                "writes": self._writes,
+                "write_waiting": self._write_waiting,
+                "avg_write_wait_ms": (self._total_write_wait / self._writes * 1000) if self._writes else 0.0,
+                "max_write_wait_ms": self._max_write_wait * 1000,
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+# One worker per pooled connection so executor threads never queue on the pool
+_executor = ThreadPoolExecutor(max_workers=DATABASE_POOL_SIZE, thread_name_prefix="db")
 
 def initialize_database():
     """Initialize database with required tables"""
     ensure_database_directory()
     
-    conn = get_db_connection_service()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            is_human BOOLEAN NOT NULL,
-            image_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (chat_id) REFERENCES chats (id)
-        )
-    ''')
+    with get_db_write_connection_service() as conn:
+        version = run_migrations(conn)
+        _seed_admin_user(conn)
     
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            is_temporary_password BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_admin BOOLEAN DEFAULT FALSE
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS password_reset_tokens (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            token TEXT NOT NULL UNIQUE,
-            expires_at DATETIME NOT NULL,
-            created_at DATETIME NOT NULL,
-            used_at DATETIME NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-        )
-    ''')
-
-    admin_hash = hashlib.sha256(ADMIN_PASSWORD.encode()).hexdigest()
+    print(f"Database initialized at: {DATABASE_PATH} (schema version {version})")
+
+
+def _seed_admin_user(conn):
+    cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM users WHERE email = ? AND is_admin = TRUE', (ADMIN_EMAIL,))
     if not cursor.fetchone():
+        admin_hash = hash_password_sync(ADMIN_PASSWORD)
         cursor.execute('''
             INSERT INTO users (email, password_hash, is_temporary_password, is_admin) 
             VALUES (?, ?, FALSE, TRUE)
         ''', (ADMIN_EMAIL, admin_hash))
     
-    conn.commit()
     cursor.close()
-    conn.close()
-    
-    print(f"Database initialized at: {DATABASE_PATH}")
 
 
 def ensure_database_directory():
@@ -76,14 +224,55 @@ def ensure_database_directory():
         os.makedirs(DATABASE_DIR)
         print(f"Created database directory: {DATABASE_DIR}")
 
+def get_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                ensure_database_directory()
+                _pool = ConnectionPool(
+                    DATABASE_PATH,
+                    DATABASE_POOL_SIZE,
+                    DATABASE_POOL_TIMEOUT,
+                    pragmas=DATABASE_PRAGMAS,
+                    write_timeout=DATABASE_WRITE_TIMEOUT,
+                )
+    return _pool
+
 def get_db_connection_service():
-    """Get database connection, creating directory if needed"""
-    ensure_database_directory()
-    
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    Check out a pooled database connection.
+    Use as a context manager so the connection is returned to the pool.
+    """
+    return get_pool().connection()
+
+def get_db_write_connection_service():
+    """
+    Check out the database connection used for writes.
+    Writers are serialized so concurrent streams queue up instead of
+    failing with "database is locked"; the block runs in one transaction.
+    """
+    return get_pool().write_connection()
+
+def get_pool_stats() -> dict:
+    """Connection pool size, wait time and checkout latency counters"""
+    return get_pool().stats()
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking database function on the database executor.
+    Async services await this instead of calling sqlite3 on the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def close_database_pool():
+    """Close all idle pooled connections"""
+    if _pool is not None:
+        _pool.close()
 
 def get_db():
     """Dependency to get database connection"""
-    return get_db_connection_service()
\ No newline at end of file
+    with get_db_connection_service() as conn:
+        yield conn
\ No newline at end of file
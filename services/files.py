@@ -1,10 +1,21 @@
 import os
+import uuid
 import base64
+from typing import Optional
 from fastapi import HTTPException, status
-from services.database import get_db_connection_service
-from constants import OUTPUT_DIR
+from fastapi.responses import Response
+import asyncio
+from services.storage import get_storage
+from constants import OUTPUT_DIR, AUDIO_FILE_TTL, AUDIO_SWEEP_INTERVAL
 
-def get_user_image(image_id: str, current_user: dict) -> str:
+AUDIO_CONTENT_TYPES = {
+    "wav": "audio/wav",
+    "pcm16": "audio/L16; rate=24000; channels=1",
+    "ogg": "audio/ogg",
+    "mp3": "audio/mpeg",
+}
+
+async def get_user_image(image_id: str, current_user: dict) -> str:
     """
     Get a base64-encoded image if it belongs to the current user.
     
@@ -20,27 +31,7 @@ def get_user_image(image_id: str, current_user: dict) -> str:
     """
     print(f"DEBUG: Looking for image_id: {image_id} for user_id: {current_user['id']}")
     
-    db = get_db_connection_service()
-    c = db.cursor()
-    
-    c.execute('''
-        SELECT m.image_id, ch.user_id, ch.id as chat_id
-        FROM messages m
-        JOIN chats ch ON m.chat_id = ch.id
-        WHERE ch.user_id = ? AND m.image_id IS NOT NULL
-    ''', (current_user['id'],))
-    
-    all_user_images = c.fetchall()
-    print(f"DEBUG: All images for user {current_user['id']}: {[dict(row) for row in all_user_images]}")
-    
-    c.execute('''
-        SELECT m.image_id 
-        FROM messages m
-        JOIN chats ch ON m.chat_id = ch.id
-        WHERE m.image_id = ? AND ch.user_id = ?
-    ''', (image_id, current_user['id']))
-    
-    result = c.fetchone()
+    result = await get_storage().user_owns_image(image_id, current_user['id'])
     print(f"DEBUG: Query result for image {image_id}: {result}")
     
     if not result:
@@ -49,6 +40,10 @@ def get_user_image(image_id: str, current_user: dict) -> str:
             detail="Image not found or access denied"
         )
     
+    return await asyncio.to_thread(_read_image_file, image_id)
+
+def _read_image_file(image_id: str) -> str:
+    """Read an image from OUTPUT_DIR and base64-encode it"""
     image_path = os.path.join(OUTPUT_DIR, image_id + ".png")
     print(f"DEBUG: Looking for image file at: {image_path}")
     print(f"DEBUG: OUTPUT_DIR is: {OUTPUT_DIR}")
@@ -90,7 +85,7 @@ async def get_user_image_service(image_id: str, current_user: dict) -> dict:
     Returns:
         Dictionary containing the base64-encoded image and metadata
     """
-    base64_image = get_user_image(image_id, current_user)
+    base64_image = await get_user_image(image_id, current_user)
     
     image_path = os.path.join(OUTPUT_DIR, image_id + ".png")
     file_size = os.path.getsize(image_path)
@@ -102,7 +97,7 @@ async def get_user_image_service(image_id: str, current_user: dict) -> dict:
         "encoding": "base64"
     }
 
-def validate_image_ownership(image_id: str, current_user: dict) -> bool:
+async def validate_image_ownership(image_id: str, current_user: dict) -> bool:
     """
     Check if an image belongs to the current user without retrieving it.
     
@@ -113,14 +108,45 @@ def validate_image_ownership(image_id: str, current_user: dict) -> bool:
     Returns:
         True if the image belongs to the user, False otherwise
     """
-    db = get_db_connection_service()
-    c = db.cursor()
-    
-    c.execute('''
-        SELECT 1 
-        FROM messages m
-        JOIN chats ch ON m.chat_id = ch.id
-        WHERE m.image_id = ? AND ch.user_id = ?
-    ''', (image_id, current_user['id']))
+    return await get_storage().user_owns_image(image_id, current_user['id'])
+
+async def sweep_expired_audio_files() -> int:
+    """Delete audio older than AUDIO_FILE_TTL and return how many files went"""
+    return await get_storage().delete_audio_files_older_than(AUDIO_FILE_TTL)
+
+async def run_audio_sweeper():
+    """Background task started in the app lifespan"""
+    while True:
+        try:
+            removed = await sweep_expired_audio_files()
+            if removed:
+                print(f"Removed {removed} expired audio files")
+        except Exception as e:
+            print(f"Audio sweep failed: {e}")
+        await asyncio.sleep(AUDIO_SWEEP_INTERVAL)
+
+def audio_url(audio_id: str) -> str:
+    return f"/api/files/audio/{audio_id}"
+
+async def save_audio_file(audio: bytes, audio_format: str, user_id: int, chat_id: Optional[int] = None) -> str:
+    """Store synthesized audio for the audio download route and return its ID.
+
+    The bytes go into the shared database, so any API node can serve the URL.
+    """
+    audio_id = str(uuid.uuid4())
+    await get_storage().add_audio_file(audio_id, user_id, chat_id, audio_format, audio)
+    return audio_id
+
+async def get_user_audio_service(audio_id: str, current_user: dict) -> Response:
+    """Serve an audio file if it belongs to the current user"""
+    record = await get_storage().get_user_audio_file(audio_id, current_user['id'])
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Audio not found or access denied"
+        )
     
-    return c.fetchone() is not None
\ No newline at end of file
+    return Response(
+        content=bytes(record['data']),
+        media_type=AUDIO_CONTENT_TYPES.get(record['format'], "application/octet-stream")
+    )
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Admission queue in front of the shared LLM.
+
+Requests wait in a bounded queue and are granted one of a fixed number of
+model slots in priority order; within a priority level users are served
+round-robin, so one user's burst cannot starve everyone else. The
+scheduler knows nothing about the model itself, so any workload (or a
+fake LLM) can be run under it.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, status
+from constants import (
+    LLM_CONCURRENCY,
+    LLM_QUEUE_MAX_SIZE,
+    LLM_BACKGROUND_QUEUE_MAX_SIZE,
+    LLM_QUEUE_TIMEOUT,
+    LLM_GENERATION_TIMEOUT,
+)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+# Background work such as summarizing chats
+PRIORITY_LOW = 2
+
+class Ticket:
+    """A request's place in the queue, and later its model slot"""
+
+    def __init__(self, scheduler: "LLMScheduler", user_id, priority: int):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.priority = priority
+        self.submitted_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self._granted = asyncio.get_running_loop().create_future()
+        self._moved = asyncio.Event()
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left of a granted ticket's generation budget, or None while it waits"""
+        if self.granted_at is None:
+            return None
+        return max(0.0, self.granted_at + self.scheduler.generation_timeout - time.monotonic())
+
+    async def wait(self) -> AsyncIterator[int]:
+        """
+        Yield the 1-based queue position every time it changes, returning
+        once the slot is granted. Raises TimeoutError after the queue
+        timeout; the ticket is then already removed from the queue.
+        """
+        deadline = self.submitted_at + self.scheduler.queue_timeout
+        last_position = None
+        while not self.granted:
+            # Cleared first, so a move while the caller handles a position is seen on the next pass
+            self._moved.clear()
+            position = self.scheduler.position(self)
+            if position != last_position:
+                last_position = position
+                yield position
+                if self.granted:
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.scheduler.time_out(self)
+                raise TimeoutError("Timed out waiting for the model")
+            moved = asyncio.ensure_future(self._moved.wait())
+            try:
+                await asyncio.wait(
+                    {self._granted, moved}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                moved.cancel()
+
+class LLMScheduler:
+    def __init__(
+        self,
+        concurrency: int = LLM_CONCURRENCY,
+        max_queue: int = LLM_QUEUE_MAX_SIZE,
+        max_background_queue: int = LLM_BACKGROUND_QUEUE_MAX_SIZE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        generation_timeout: float = LLM_GENERATION_TIMEOUT,
+    ):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_background_queue = max_background_queue
+        self.queue_timeout = queue_timeout
+        self.generation_timeout = generation_timeout
+        # priority -> user_id -> tickets; dict order is the round-robin turn
+        self._waiting = {}
+        self._waiting_count = 0
+        self._running = set()
+        self.granted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self._total_wait = 0.0
+
+    def _queued(self, priority: int) -> int:
+        return sum(len(tickets) for tickets in self._waiting.get(priority, {}).values())
+
+    def submit(self, user_id, priority: int = PRIORITY_NORMAL) -> Ticket:
+        """
+        Queue a request, raising 503 when its queue is full. Low-priority
+        background requests have their own cap and never count against
+        interactive ones.
+        """
+        background = self._queued(PRIORITY_LOW)
+        if priority >= PRIORITY_LOW:
+            full = background >= self.max_background_queue
+        else:
+            full = self._waiting_count - background >= self.max_queue
+        if full:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The model is busy, please try again",
+                headers={"Retry-After": "5"},
+            )
+        ticket = Ticket(self, user_id, priority)
+        users = self._waiting.setdefault(priority, OrderedDict())
+        users.setdefault(user_id, deque()).append(ticket)
+        self._waiting_count += 1
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Give back a slot or leave the queue; safe to call more than once"""
+        if ticket in self._running:
+            self._running.discard(ticket)
+        elif not ticket.granted and self._remove_waiting(ticket):
+            self.cancelled += 1
+            ticket._granted.cancel()
+        else:
+            return
+        self._dispatch()
+
+    def time_out(self, ticket: Ticket):
+        """Drop a ticket that waited past the queue timeout"""
+        if not ticket.granted and self._remove_waiting(ticket):
+            self.timeouts += 1
+            ticket._granted.cancel()
+            self._dispatch()
+
+    def _remove_waiting(self, ticket: Ticket) -> bool:
+        users = self._waiting.get(ticket.priority, {})
+        tickets = users.get(ticket.user_id)
+        if not tickets or ticket not in tickets:
+            return False
+        tickets.remove(ticket)
+        if not tickets:
+            del users[ticket.user_id]
+        self._waiting_count -= 1
+        return True
+
+    def _next_ticket(self) -> Optional[Ticket]:
+        for priority in sorted(self._waiting):
+            users = self._waiting[priority]
+            if not users:
+                continue
+            user_id, tickets = next(iter(users.items()))
+            ticket = tickets.popleft()
+            del users[user_id]
+            if tickets:
+                users[user_id] = tickets
+            self._waiting_count -= 1
+            return ticket
+        return None
+
+    def _dispatch(self):
+        while len(self._running) < self.concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted_at = time.monotonic()
+            self._total_wait += ticket.granted_at - ticket.submitted_at
+            self.granted += 1
+            self._running.add(ticket)
+            ticket._granted.set_result(None)
+        for users in self._waiting.values():
+            for tickets in users.values():
+                for ticket in tickets:
+                    ticket._moved.set()
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in the serving order, or 0 once granted"""
+        if ticket.granted:
+            return 0
+        position = 0
+        for priority in sorted(self._waiting):
+            queues = list(self._waiting[priority].values())
+            depth = max((len(tickets) for tickets in queues), default=0)
+            for round_index in range(depth):
+                for tickets in queues:
+                    if round_index < len(tickets):
+                        position += 1
+                        if tickets[round_index] is ticket:
+                            return position
+        return position
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "waiting": self._waiting_count,
+            "background_waiting": self._queued(PRIORITY_LOW),
+            "max_queue": self.max_queue,
+            "max_background_queue": self.max_background_queue,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "avg_wait_ms": self._total_wait / self.granted * 1000 if self.granted else 0.0,
+        }
+
+_scheduler = None
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
@@ -0,0 +1,125 @@
+"""
+Per-chat llama.cpp state cache.
+
+llama.cpp only re-evaluates the part of a prompt that differs from the
+tokens already in its KV cache. With several chats sharing one model that
+cache normally holds whichever chat ran last, so every turn re-reads the
+system prompt, tool descriptions and history from scratch. Saving the model
+state after a chat's turn and restoring it before the next one means a
+follow-up only evaluates the tokens that are new.
+"""
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Optional
+from constants import LLM_STATE_CACHE_BYTES, LLM_STATE_CACHE_DIR
+
+def _state_bytes(state) -> int:
+    return state.llama_state_size + state.scores.nbytes + state.input_ids.nbytes
+
+class LLMStateCache:
+    """LRU of saved model states keyed by chat id, bounded by total bytes"""
+
+    def __init__(self, capacity_bytes: int, spill_dir: Optional[str] = None):
+        self.capacity_bytes = capacity_bytes
+        self.spill_dir = spill_dir
+        self._states = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefills = 0
+        self._prefill_total = 0.0
+        self.last_prefill_ms = None
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, key) -> str:
+        return os.path.join(self.spill_dir, f"chat_{key}.state")
+
+    def restore(self, model, key) -> bool:
+        """Load the saved state for key into a llama_cpp.Llama; False if there is none"""
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+                self.hits += 1
+        if state is None and self.spill_dir and os.path.exists(self._spill_path(key)):
+            with open(self._spill_path(key), 'rb') as f:
+                state = pickle.load(f)
+            os.remove(self._spill_path(key))
+            self._put(key, state)
+            with self._lock:
+                self.disk_hits += 1
+        if state is None:
+            with self._lock:
+                self.misses += 1
+            return False
+        model.load_state(state)
+        return True
+
+    def save(self, model, key):
+        """Snapshot the model's current state under key"""
+        self._put(key, model.save_state())
+
+    def _put(self, key, state):
+        size = _state_bytes(state)
+        evicted = []
+        with self._lock:
+            old = self._states.pop(key, None)
+            if old is not None:
+                self._bytes -= _state_bytes(old)
+            if size > self.capacity_bytes:
+                return
+            self._states[key] = state
+            self._bytes += size
+            while self._bytes > self.capacity_bytes:
+                old_key, old_state = self._states.popitem(last=False)
+                self._bytes -= _state_bytes(old_state)
+                self.evictions += 1
+                evicted.append((old_key, old_state))
+        if self.spill_dir:
+            for old_key, old_state in evicted:
+                with open(self._spill_path(old_key), 'wb') as f:
+                    pickle.dump(old_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def discard(self, key):
+        """Forget a chat, e.g. after it is deleted"""
+        with self._lock:
+            state = self._states.pop(key, None)
+            if state is not None:
+                self._bytes -= _state_bytes(state)
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            os.remove(self._spill_path(key))
+
+    def record_prefill(self, seconds: float):
+        with self._lock:
+            self.prefills += 1
+            self._prefill_total += seconds
+            self.last_prefill_ms = seconds * 1000
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._states),
+                "bytes": self._bytes,
+                "capacity_bytes": self.capacity_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "prefills": self.prefills,
+                "avg_prefill_ms": self._prefill_total / self.prefills * 1000 if self.prefills else 0.0,
+                "last_prefill_ms": self.last_prefill_ms,
+            }
+
+_state_cache = None
+
+def get_llm_state_cache() -> LLMStateCache:
+    global _state_cache
+    if _state_cache is None:
+        _state_cache = LLMStateCache(LLM_STATE_CACHE_BYTES, LLM_STATE_CACHE_DIR)
+    return _state_cache
@@ -0,0 +1,192 @@
+"""
+Conversation memory for the agent prompt.
+
+Each chat keeps a rolling summary in the database. Prompts get that summary
+plus the latest messages it does not cover, up to MEMORY_RECENT_TOKEN_BUDGET.
+Once those outgrow the budget, a background task folds all but the newest
+MEMORY_RECENT_TOKEN_LOW_WATER tokens into the summary, so older context is
+condensed instead of lost. Between refreshes a prompt only grows at the end,
+so the model state saved after one turn is a prefix of the next prompt.
+Token counts come from the model's tokenizer and are memoized per message.
+"""
+import asyncio
+from typing import List, Optional
+from constants import (
+    MEMORY_RECENT_MESSAGES,
+    MEMORY_RECENT_TOKEN_BUDGET,
+    MEMORY_RECENT_TOKEN_LOW_WATER,
+    MEMORY_SUMMARY_MAX_TOKENS,
+    MEMORY_SUMMARY_BATCH,
+)
+from dependencies import llm
+from services.agent import run_on_model
+from services.llm_scheduler import get_llm_scheduler, PRIORITY_LOW
+from services.storage import get_storage
+
+SUMMARY_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new summary. Keep names, facts and decisions; drop small talk.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+# Keeps background refreshes referenced until they finish
+_refresh_tasks = {}
+
+HISTORY_HEADER = "Previous conversation:"
+QUESTION_PREFIX = "Current question: "
+HISTORY_REMINDER = "Remember our conversation history when responding."
+SUMMARY_PREFIX = "Summary of earlier conversation: "
+# "Human: " / "Assistant: " and the line break
+ROLE_TOKENS = 4
+
+def _tokenize(text: str) -> List[int]:
+    return llm.client.tokenize(text.encode("utf-8"), add_bos=False)
+
+def count_tokens(text: str) -> int:
+    """Token count according to the model's tokenizer"""
+    return len(_tokenize(text))
+
+def _tail(text: str, max_tokens: int) -> str:
+    """The last max_tokens tokens of text, marked as cut"""
+    tokens = _tokenize(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return "..." + llm.client.detokenize(tokens[-max_tokens:]).decode("utf-8", errors="ignore")
+
+def _count_missing(messages: List[dict]) -> List[tuple]:
+    counts = []
+    for message in messages:
+        if message.get('token_count') is None:
+            message['token_count'] = count_tokens(message['content'])
+            counts.append((message['id'], message['token_count']))
+    return counts
+
+async def _recent_messages(chat_id: int) -> List[dict]:
+    """Latest messages with their token counts, memoizing any that were missing"""
+    storage = get_storage()
+    messages = await storage.get_recent_messages(chat_id, MEMORY_RECENT_MESSAGES)
+    counts = await asyncio.to_thread(_count_missing, messages)
+    if counts:
+        await storage.set_message_token_counts(counts)
+    return messages
+
+def recent_window(messages: List[dict], budget: int = MEMORY_RECENT_TOKEN_BUDGET) -> List[dict]:
+    """
+    The newest messages (oldest first) whose combined size fits the budget.
+    The newest message is always kept, cut down to its end if it alone is
+    over budget, so a follow-up to a long answer still sees that answer.
+    """
+    window = []
+    used = 0
+    for message in reversed(messages):
+        used += message['token_count'] + ROLE_TOKENS
+        if used > budget:
+            if not window:
+                content = _tail(message['content'], max(1, budget - ROLE_TOKENS))
+                window.append({**message, 'content': content, 'token_count': count_tokens(content)})
+            break
+        window.append(message)
+    window.reverse()
+    return window
+
+async def get_chat_memory(chat_id: int) -> dict:
+    """Summary of older turns and the recent messages it does not cover yet"""
+    summary, recent = await asyncio.gather(
+        get_storage().get_chat_summary(chat_id),
+        _recent_messages(chat_id),
+    )
+    last_id = summary['last_message_id'] if summary else 0
+    return {
+        "summary": summary['summary'] if summary else None,
+        "messages": [message for message in recent if message['id'] > last_id],
+        "has_history": bool(recent),
+    }
+
+def build_question_with_history(question: str, memory: dict, budget: int = MEMORY_RECENT_TOKEN_BUDGET) -> str:
+    """
+    Prefix the question with the chat summary and the recent turns that fit
+    in budget tokens. After a summary refresh every uncovered turn fits, so
+    every turn is either quoted or summarized; recent_window only drops
+    turns while a refresh is still behind.
+    Runs the tokenizer, so call it off the event loop.
+    """
+    summary = memory["summary"]
+    window = recent_window(memory["messages"], budget)
+    if not summary and not window:
+        return question
+    return "\n".join([
+        HISTORY_HEADER,
+        *([SUMMARY_PREFIX + summary] if summary else []),
+        *([_format_lines(window)] if window else []),
+        "",
+        f"{QUESTION_PREFIX}{question}",
+        "",
+        HISTORY_REMINDER,
+    ])
+
+def _format_lines(messages: List[dict]) -> str:
+    return "\n".join(
+        f"{'Human' if message['is_human'] else 'Assistant'}: {message['content']}"
+        for message in messages
+    )
+
+def _summarize(summary: str, messages: List[dict]) -> str:
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", new_lines=_format_lines(messages))
+    return llm.invoke(prompt, max_tokens=MEMORY_SUMMARY_MAX_TOKENS).strip()
+
+def _needs_refresh(unsummarized: List[dict]) -> bool:
+    """True once the turns the summary does not cover no longer fit in one prompt"""
+    used = sum(message['token_count'] + ROLE_TOKENS for message in unsummarized)
+    # A full page of recent messages may have older uncovered ones behind it
+    return used > MEMORY_RECENT_TOKEN_BUDGET or len(unsummarized) >= MEMORY_RECENT_MESSAGES
+
+async def refresh_chat_summary(chat_id: int) -> Optional[str]:
+    """
+    Fold older messages into the chat's summary once the uncovered ones
+    outgrow the recent budget, keeping the newest low-water share quoted.
+    """
+    storage = get_storage()
+    current = await storage.get_chat_summary(chat_id)
+    last_id = current['last_message_id'] if current else 0
+    unsummarized = [message for message in await _recent_messages(chat_id) if message['id'] > last_id]
+    if not _needs_refresh(unsummarized):
+        return None
+    window = await asyncio.to_thread(recent_window, unsummarized, MEMORY_RECENT_TOKEN_LOW_WATER)
+    window = window[-(MEMORY_RECENT_MESSAGES // 2):]
+    window_start = window[0]['id']
+    pending = [
+        message
+        for message in await storage.list_messages(chat_id, None, last_id, MEMORY_SUMMARY_BATCH)
+        if message['id'] < window_start
+    ]
+    if not pending:
+        return None
+
+    scheduler = get_llm_scheduler()
+    ticket = scheduler.submit(f"memory:{chat_id}", PRIORITY_LOW)
+    try:
+        async for _ in ticket.wait():
+            pass
+        summary = await run_on_model(_summarize, current['summary'] if current else "", pending)
+    finally:
+        scheduler.release(ticket)
+
+    await storage.save_chat_summary(chat_id, summary, pending[-1]['id'])
+    return summary
+
+async def _refresh_in_background(chat_id: int):
+    try:
+        await refresh_chat_summary(chat_id)
+    except Exception as e:
+        print(f"Summary refresh for chat {chat_id} failed: {e}")
+    finally:
+        _refresh_tasks.pop(chat_id, None)
+
+def schedule_summary_refresh(chat_id: int):
+    """Start a summary refresh for the chat unless one is already running"""
+    if chat_id not in _refresh_tasks:
+        _refresh_tasks[chat_id] = asyncio.create_task(_refresh_in_background(chat_id))
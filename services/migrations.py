@@ -0,0 +1,238 @@
+"""Versioned schema migrations, applied in order at startup"""
+
+# (version, description, {dialect: [statements]})
+MIGRATIONS = [
+    (1, "Create base tables", {
+        "sqlite": [
+            '''
+            CREATE TABLE IF NOT EXISTS chats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                is_human BOOLEAN NOT NULL,
+                image_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (chat_id) REFERENCES chats (id)
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                is_temporary_password BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_admin BOOLEAN DEFAULT FALSE
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS password_reset_tokens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                token TEXT NOT NULL UNIQUE,
+                expires_at DATETIME NOT NULL,
+                created_at DATETIME NOT NULL,
+                used_at DATETIME NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+            ''',
+        ],
+        "postgres": [
+            '''
+            CREATE TABLE IF NOT EXISTS chats (
+                id BIGSERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                title TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS messages (
+                id BIGSERIAL PRIMARY KEY,
+                chat_id BIGINT NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+                content TEXT NOT NULL,
+                is_human BOOLEAN NOT NULL,
+                image_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS users (
+                id BIGSERIAL PRIMARY KEY,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                is_temporary_password BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_admin BOOLEAN DEFAULT FALSE
+            )
+            ''',
+            '''
+            CREATE TABLE IF NOT EXISTS password_reset_tokens (
+                id BIGSERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                token TEXT NOT NULL UNIQUE,
+                expires_at TIMESTAMP NOT NULL,
+                created_at TIMESTAMP NOT NULL,
+                used_at TIMESTAMP NULL
+            )
+            ''',
+        ],
+    }),
+    # password_reset_tokens.token is already indexed by its UNIQUE constraint
+    (2, "Index chat, message and image lookups", {
+        "sqlite": [
+            'CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages (chat_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_chats_user_created ON chats (user_id, created_at DESC, title)',
+            'CREATE INDEX IF NOT EXISTS idx_messages_image ON messages (image_id, chat_id) WHERE image_id IS NOT NULL',
+            'ANALYZE',
+        ],
+        "postgres": [
+            'CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages (chat_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_chats_user_created ON chats (user_id, created_at DESC) INCLUDE (title)',
+            'CREATE INDEX IF NOT EXISTS idx_messages_image ON messages (image_id, chat_id) WHERE image_id IS NOT NULL',
+            'ANALYZE',
+        ],
+    }),
+    (3, "Index keyset pagination of chats and messages", {
+        "sqlite": [
+            'CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages (chat_id, id)',
+            'CREATE INDEX IF NOT EXISTS idx_chats_user_id ON chats (user_id, id)',
+            'ANALYZE',
+        ],
+        "postgres": [
+            'CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages (chat_id, id)',
+            'CREATE INDEX IF NOT EXISTS idx_chats_user_id ON chats (user_id, id)',
+            'ANALYZE',
+        ],
+    }),
+    (4, "Add rolling chat summaries", {
+        "sqlite": [
+            '''
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                chat_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (chat_id) REFERENCES chats (id)
+            )
+            ''',
+        ],
+        "postgres": [
+            '''
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                chat_id BIGINT PRIMARY KEY REFERENCES chats (id) ON DELETE CASCADE,
+                summary TEXT NOT NULL,
+                last_message_id BIGINT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+        ],
+    }),
+    # Filled lazily the first time a message is counted for a prompt
+    (5, "Memoize message token counts", {
+        "sqlite": [
+            'ALTER TABLE messages ADD COLUMN token_count INTEGER',
+        ],
+        "postgres": [
+            'ALTER TABLE messages ADD COLUMN IF NOT EXISTS token_count INTEGER',
+        ],
+    }),
+    (6, "Track generated audio files", {
+        "sqlite": [
+            '''
+            CREATE TABLE IF NOT EXISTS audio_files (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER,
+                format TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_audio_files_chat_id ON audio_files (chat_id)',
+        ],
+        "postgres": [
+            '''
+            CREATE TABLE IF NOT EXISTS audio_files (
+                id TEXT PRIMARY KEY,
+                user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                chat_id BIGINT REFERENCES chats (id) ON DELETE CASCADE,
+                format TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_audio_files_chat_id ON audio_files (chat_id)',
+        ],
+    }),
+    # Every chat and message query orders by id since migration 3; these only slowed inserts
+    (7, "Drop the created_at indexes replaced by keyset indexes", {
+        "sqlite": [
+            'DROP INDEX IF EXISTS idx_messages_chat_created',
+            'DROP INDEX IF EXISTS idx_chats_user_created',
+        ],
+        "postgres": [
+            'DROP INDEX IF EXISTS idx_messages_chat_created',
+            'DROP INDEX IF EXISTS idx_chats_user_created',
+        ],
+    }),
+    # Audio bytes move from one node's disk into the shared database; rows
+    # pointing at local files are dropped, since other nodes cannot serve them
+    (8, "Store audio in the database", {
+        "sqlite": [
+            'DELETE FROM audio_files',
+            "ALTER TABLE audio_files ADD COLUMN data BLOB NOT NULL DEFAULT x''",
+            'CREATE INDEX IF NOT EXISTS idx_audio_files_created ON audio_files (created_at)',
+        ],
+        "postgres": [
+            'DELETE FROM audio_files',
+            'ALTER TABLE audio_files ADD COLUMN IF NOT EXISTS data BYTEA NOT NULL',
+            'CREATE INDEX IF NOT EXISTS idx_audio_files_created ON audio_files (created_at)',
+        ],
+    }),
+]
+
+SCHEMA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def pending_migrations(current: int, dialect: str):
+    """Yield (version, description, statements) for migrations newer than current"""
+    for version, description, statements in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version > current:
+            yield version, description, statements[dialect]
+
+def get_schema_version(conn) -> int:
+    """Return the highest applied migration version"""
+    conn.execute(SCHEMA_VERSION_TABLE)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def run_migrations(conn) -> int:
+    """
+    Apply every migration newer than the recorded schema version to a
+    SQLite connection. Runs inside the caller's transaction, so a failing
+    migration leaves the schema untouched.
+    """
+    current = get_schema_version(conn)
+    for version, description, statements in pending_migrations(current, "sqlite"):
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(
+            'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+            (version, description)
+        )
+        print(f"Applied migration {version}: {description}")
+        current = version
+    return current
@@ -0,0 +1,55 @@
+"""Password hashing with scrypt, run off the event loop"""
+import asyncio
+import hashlib
+import hmac
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from constants import PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P, PASSWORD_HASH_WORKERS
+
+SCRYPT_PREFIX = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# hashlib.scrypt releases the GIL, so threads run in parallel; the pool
+# size caps how many CPU-heavy hashes a login storm can run at once
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="kdf")
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024,
+        dklen=KEY_BYTES,
+    )
+
+def hash_password_sync(password: str) -> str:
+    """Hash a password as scrypt$n$r$p$salt$hash"""
+    salt = secrets.token_bytes(SALT_BYTES)
+    n, r, p = PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+    key = _scrypt(password, salt, n, r, p)
+    return f"{SCRYPT_PREFIX}${n}${r}${p}${salt.hex()}${key.hex()}"
+
+def verify_password_sync(password: str, stored_hash: str) -> bool:
+    """Check a password against a scrypt hash or a legacy unsalted SHA-256 hex digest"""
+    if not stored_hash.startswith(SCRYPT_PREFIX + "$"):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored_hash)
+    try:
+        _, n, r, p, salt, key = stored_hash.split("$")
+        expected = bytes.fromhex(key)
+        actual = _scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True for legacy hashes and scrypt hashes made with other cost parameters"""
+    current = f"{SCRYPT_PREFIX}${PASSWORD_SCRYPT_N}${PASSWORD_SCRYPT_R}${PASSWORD_SCRYPT_P}$"
+    return not stored_hash.startswith(current)
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, hash_password_sync, password)
+
+async def verify_password(password: str, stored_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, verify_password_sync, password, stored_hash)
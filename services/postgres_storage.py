@@ -0,0 +1,322 @@
+"""PostgreSQL implementation of the storage backend, for multi-node deployments"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+from constants import POSTGRES_DSN, POSTGRES_POOL_MIN_SIZE, POSTGRES_POOL_MAX_SIZE, ADMIN_EMAIL, ADMIN_PASSWORD
+from services.migrations import SCHEMA_VERSION_TABLE, pending_migrations
+from services.passwords import hash_password
+from services.storage import StorageBackend
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+# Arbitrary key so concurrent nodes don't run migrations at the same time
+MIGRATION_LOCK_ID = 7246013
+
+def _row(record) -> Optional[dict]:
+    """Convert a record to the dict shape the SQLite backend returns"""
+    if record is None:
+        return None
+    row = dict(record)
+    if isinstance(row.get('created_at'), datetime):
+        row['created_at'] = row['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    return row
+
+class PostgresStorage(StorageBackend):
+    """Shared storage on PostgreSQL through an asyncpg connection pool"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        if asyncpg is None:
+            raise RuntimeError("The postgres storage backend requires asyncpg (pip install asyncpg)")
+        self.dsn = dsn or POSTGRES_DSN
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            raise RuntimeError("PostgresStorage.initialize() has not been awaited")
+        return self._pool
+
+    async def initialize(self):
+        self._pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=POSTGRES_POOL_MIN_SIZE,
+            max_size=POSTGRES_POOL_MAX_SIZE,
+        )
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('SELECT pg_advisory_xact_lock($1)', MIGRATION_LOCK_ID)
+                version = await self._run_migrations(conn)
+                await self._seed_admin_user(conn)
+        print(f"Database initialized at: {self.dsn.rsplit('@', 1)[-1]} (schema version {version})")
+
+    async def _run_migrations(self, conn) -> int:
+        await conn.execute(SCHEMA_VERSION_TABLE)
+        current = await conn.fetchval('SELECT MAX(version) FROM schema_version') or 0
+        for version, description, statements in pending_migrations(current, "postgres"):
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES ($1, $2)',
+                version, description
+            )
+            print(f"Applied migration {version}: {description}")
+            current = version
+        return current
+
+    async def _seed_admin_user(self, conn):
+        exists = await conn.fetchval(
+            'SELECT 1 FROM users WHERE email = $1 AND is_admin = TRUE', ADMIN_EMAIL
+        )
+        if not exists:
+            admin_hash = await hash_password(ADMIN_PASSWORD)
+            await conn.execute('''
+                INSERT INTO users (email, password_hash, is_temporary_password, is_admin)
+                VALUES ($1, $2, FALSE, TRUE)
+            ''', ADMIN_EMAIL, admin_hash)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def stats(self) -> dict:
+        if self._pool is None:
+            return {"backend": "postgres"}
+        return {
+            "backend": "postgres",
+            "pool_size": self._pool.get_max_size(),
+            "connections": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "in_use": self._pool.get_size() - self._pool.get_idle_size(),
+        }
+
+    # Chats
+
+    async def create_chat(self, user_id: int, title: str) -> int:
+        return await self.pool.fetchval(
+            'INSERT INTO chats (user_id, title) VALUES ($1, $2) RETURNING id', user_id, title
+        )
+
+    async def get_chat(self, chat_id: int) -> Optional[dict]:
+        return _row(await self.pool.fetchrow(
+            'SELECT id, title, created_at, user_id FROM chats WHERE id = $1', chat_id
+        ))
+
+    async def user_owns_chat(self, chat_id: int, user_id: int) -> bool:
+        return await self.pool.fetchval(
+            'SELECT 1 FROM chats WHERE id = $1 AND user_id = $2', chat_id, user_id
+        ) is not None
+
+    async def delete_chat(self, chat_id: int, user_id: int) -> bool:
+        result = await self.pool.execute(
+            'DELETE FROM chats WHERE id = $1 AND user_id = $2', chat_id, user_id
+        )
+        return result != 'DELETE 0'
+
+    async def list_chats(self, user_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        if after_id is not None:
+            records = await self.pool.fetch('''
+                SELECT id, title, created_at, user_id
+                FROM chats
+                WHERE user_id = $1 AND id > $2
+                ORDER BY id ASC
+                LIMIT $3
+            ''', user_id, after_id, limit)
+        elif before_id is not None:
+            records = await self.pool.fetch('''
+                SELECT id, title, created_at, user_id
+                FROM chats
+                WHERE user_id = $1 AND id < $2
+                ORDER BY id DESC
+                LIMIT $3
+            ''', user_id, before_id, limit)
+        else:
+            records = await self.pool.fetch('''
+                SELECT id, title, created_at, user_id
+                FROM chats
+                WHERE user_id = $1
+                ORDER BY id DESC
+                LIMIT $2
+            ''', user_id, limit)
+        return [_row(record) for record in records]
+
+    # Messages
+
+    async def add_message(self, chat_id: int, content: str, is_human: bool, image_id: Optional[str] = None) -> int:
+        return await self.pool.fetchval('''
+            INSERT INTO messages (chat_id, content, is_human, image_id)
+            VALUES ($1, $2, $3, $4)
+            RETURNING id
+        ''', chat_id, content, is_human, image_id)
+
+    async def list_messages(self, chat_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        if after_id is not None:
+            records = await self.pool.fetch('''
+                SELECT id, chat_id, content, is_human, image_id, created_at
+                FROM messages
+                WHERE chat_id = $1 AND id > $2
+                ORDER BY id ASC
+                LIMIT $3
+            ''', chat_id, after_id, limit)
+        elif before_id is not None:
+            records = await self.pool.fetch('''
+                SELECT id, chat_id, content, is_human, image_id, created_at
+                FROM messages
+                WHERE chat_id = $1 AND id < $2
+                ORDER BY id DESC
+                LIMIT $3
+            ''', chat_id, before_id, limit)
+        else:
+            records = await self.pool.fetch('''
+                SELECT id, chat_id, content, is_human, image_id, created_at
+                FROM messages
+                WHERE chat_id = $1
+                ORDER BY id DESC
+                LIMIT $2
+            ''', chat_id, limit)
+        return [_row(record) for record in records]
+
+    async def get_recent_messages(self, chat_id: int, limit: int) -> List[dict]:
+        records = await self.pool.fetch('''
+            SELECT id, content, is_human, token_count
+            FROM messages
+            WHERE chat_id = $1
+            ORDER BY id DESC
+            LIMIT $2
+        ''', chat_id, limit)
+        return [_row(record) for record in reversed(records)]
+
+    async def set_message_token_counts(self, counts: List[Tuple[int, int]]):
+        await self.pool.executemany(
+            'UPDATE messages SET token_count = $1 WHERE id = $2',
+            [(token_count, message_id) for message_id, token_count in counts]
+        )
+
+    async def get_last_ai_message(self, chat_id: int) -> Optional[dict]:
+        return _row(await self.pool.fetchrow('''
+            SELECT id, chat_id, content, is_human, image_id, created_at
+            FROM messages
+            WHERE chat_id = $1 AND is_human = FALSE
+            ORDER BY id DESC
+            LIMIT 1
+        ''', chat_id))
+
+    async def user_owns_image(self, image_id: str, user_id: int) -> bool:
+        return await self.pool.fetchval('''
+            SELECT 1
+            FROM messages m
+            JOIN chats ch ON m.chat_id = ch.id
+            WHERE m.image_id = $1 AND ch.user_id = $2
+        ''', image_id, user_id) is not None
+
+    # Audio files
+
+    async def add_audio_file(self, audio_id: str, user_id: int, chat_id: Optional[int], audio_format: str, data: bytes):
+        await self.pool.execute(
+            'INSERT INTO audio_files (id, user_id, chat_id, format, data) VALUES ($1, $2, $3, $4, $5)',
+            audio_id, user_id, chat_id, audio_format, data
+        )
+
+    async def get_user_audio_file(self, audio_id: str, user_id: int) -> Optional[dict]:
+        return _row(await self.pool.fetchrow(
+            'SELECT id, chat_id, format, data, created_at FROM audio_files WHERE id = $1 AND user_id = $2',
+            audio_id, user_id
+        ))
+
+    async def delete_audio_files_older_than(self, max_age: float) -> int:
+        result = await self.pool.execute(
+            'DELETE FROM audio_files WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => $1)',
+            float(max_age)
+        )
+        return int(result.split()[-1])
+
+    # Chat summaries
+
+    async def get_chat_summary(self, chat_id: int) -> Optional[dict]:
+        return _row(await self.pool.fetchrow(
+            'SELECT summary, last_message_id FROM chat_summaries WHERE chat_id = $1', chat_id
+        ))
+
+    async def save_chat_summary(self, chat_id: int, summary: str, last_message_id: int):
+        await self.pool.execute('''
+            INSERT INTO chat_summaries (chat_id, summary, last_message_id, updated_at)
+            VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+            ON CONFLICT (chat_id) DO UPDATE
+            SET summary = EXCLUDED.summary, last_message_id = EXCLUDED.last_message_id,
+                updated_at = EXCLUDED.updated_at
+        ''', chat_id, summary, last_message_id)
+
+    # Users
+
+    async def get_user_by_email(self, email: str) -> Optional[dict]:
+        return _row(await self.pool.fetchrow('SELECT * FROM users WHERE email = $1', email))
+
+    async def get_user_by_id(self, user_id: int) -> Optional[dict]:
+        return _row(await self.pool.fetchrow('SELECT * FROM users WHERE id = $1', user_id))
+
+    async def create_user(self, email: str, password_hash: str, is_temporary_password: bool = True) -> int:
+        return await self.pool.fetchval('''
+            INSERT INTO users (email, password_hash, is_temporary_password)
+            VALUES ($1, $2, $3)
+            RETURNING id
+        ''', email, password_hash, is_temporary_password)
+
+    async def list_users(self) -> List[dict]:
+        records = await self.pool.fetch(
+            'SELECT id, email, created_at, is_temporary_password, is_admin FROM users ORDER BY id'
+        )
+        return [_row(record) for record in records]
+
+    async def delete_user(self, user_id: int) -> bool:
+        result = await self.pool.execute(
+            'DELETE FROM users WHERE id = $1 AND is_admin = FALSE', user_id
+        )
+        return result != 'DELETE 0'
+
+    async def update_password(self, user_id: int, password_hash: str):
+        await self.pool.execute('''
+            UPDATE users
+            SET password_hash = $1, is_temporary_password = FALSE
+            WHERE id = $2
+        ''', password_hash, user_id)
+
+    async def update_password_hash(self, user_id: int, password_hash: str):
+        await self.pool.execute(
+            'UPDATE users SET password_hash = $1 WHERE id = $2', password_hash, user_id
+        )
+
+    # Password reset tokens
+
+    async def create_reset_token(self, user_id: int, token: str, expires_at: datetime):
+        await self.pool.execute('''
+            INSERT INTO password_reset_tokens (user_id, token, expires_at, created_at)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (token) DO UPDATE
+            SET user_id = EXCLUDED.user_id, expires_at = EXCLUDED.expires_at,
+                created_at = EXCLUDED.created_at, used_at = NULL
+        ''', user_id, token, expires_at, datetime.utcnow())
+
+    async def get_reset_token(self, token: str) -> Optional[dict]:
+        record = await self.pool.fetchrow('''
+            SELECT prt.id, prt.user_id, prt.expires_at, prt.used_at, u.email
+            FROM password_reset_tokens prt
+            JOIN users u ON prt.user_id = u.id
+            WHERE prt.token = $1
+        ''', token)
+        return dict(record) if record else None
+
+    async def complete_password_reset(self, token_id: int, user_id: int, password_hash: str):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('''
+                    UPDATE users
+                    SET password_hash = $1, is_temporary_password = FALSE
+                    WHERE id = $2
+                ''', password_hash, user_id)
+                await conn.execute('''
+                    UPDATE password_reset_tokens
+                    SET used_at = $1
+                    WHERE id = $2
+                ''', datetime.utcnow(), token_id)
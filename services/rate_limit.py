@@ -0,0 +1,214 @@
+"""Per-user and per-address token-bucket rate limiting and concurrent stream caps"""
+import math
+import time
+import uuid
+from abc import ABC, abstractmethod
+from fastapi import HTTPException, Request, status
+from constants import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_REDIS_URL,
+    RATE_LIMIT_MEMORY_MAX_KEYS,
+    STREAM_RATE_LIMIT_BURST,
+    STREAM_RATE_LIMIT_PER_MINUTE,
+    STREAM_IP_RATE_LIMIT_BURST,
+    STREAM_IP_RATE_LIMIT_PER_MINUTE,
+    LOGIN_RATE_LIMIT_BURST,
+    LOGIN_RATE_LIMIT_PER_MINUTE,
+    STREAM_MAX_CONCURRENT,
+    STREAM_LEASE_TTL,
+)
+from services.cache import TTLCache
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+class RateLimitStore(ABC):
+    """Where buckets and stream leases live; shared stores let several API nodes enforce one limit"""
+
+    @abstractmethod
+    async def consume(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """Take one token from a bucket; returns 0 on success, otherwise seconds until a token is available"""
+
+    @abstractmethod
+    async def acquire_lease(self, key: str, lease_id: str, limit: int, ttl: float) -> bool:
+        """Register a lease id under key unless limit live leases already exist"""
+
+    @abstractmethod
+    async def release_lease(self, key: str, lease_id: str):
+        ...
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    Per-process store; limits apply to each API node separately.
+    Entries expire once they carry no state (a refilled bucket, a key with
+    no live leases), so rotating keys cannot grow the process without bound.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MEMORY_MAX_KEYS):
+        self._buckets = TTLCache(max_keys, 0)
+        self._leases = TTLCache(max_keys, 0)
+
+    async def consume(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / refill_per_second
+        # Past this point the bucket is full again, the same as a missing entry
+        self._buckets.set(key, (tokens, now), ttl=(capacity - tokens) / refill_per_second)
+        return wait
+
+    def _store_leases(self, key: str, leases: dict, now: float):
+        if leases:
+            self._leases.set(key, leases, ttl=max(leases.values()) - now)
+        else:
+            self._leases.pop(key)
+
+    async def acquire_lease(self, key: str, lease_id: str, limit: int, ttl: float) -> bool:
+        now = time.monotonic()
+        # Expired leases belong to streams whose cleanup never ran
+        leases = {
+            lease: expires_at
+            for lease, expires_at in self._leases.get(key, {}).items()
+            if expires_at > now
+        }
+        acquired = len(leases) < limit
+        if acquired:
+            leases[lease_id] = now + ttl
+        self._store_leases(key, leases, now)
+        return acquired
+
+    async def release_lease(self, key: str, lease_id: str):
+        leases = self._leases.get(key)
+        if leases is not None:
+            leases.pop(lease_id, None)
+            self._store_leases(key, leases, time.monotonic())
+
+# KEYS[1] bucket hash; ARGV: capacity, refill per second, now
+_CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# KEYS[1] sorted set of lease ids scored by expiry; ARGV: lease id, limit, ttl, now
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3])) + 1)
+return 1
+"""
+
+class RedisRateLimitStore(RateLimitStore):
+    """Store shared by every API node through Redis"""
+
+    def __init__(self, url: str = None):
+        if redis is None:
+            raise RuntimeError("The redis rate limit backend requires redis (pip install redis)")
+        self.client = redis.from_url(url or RATE_LIMIT_REDIS_URL)
+        self._consume = self.client.register_script(_CONSUME_SCRIPT)
+        self._acquire = self.client.register_script(_ACQUIRE_SCRIPT)
+
+    async def consume(self, key: str, capacity: float, refill_per_second: float) -> float:
+        wait = await self._consume(keys=[f"bucket:{key}"], args=[capacity, refill_per_second, time.time()])
+        return float(wait)
+
+    async def acquire_lease(self, key: str, lease_id: str, limit: int, ttl: float) -> bool:
+        acquired = await self._acquire(keys=[f"leases:{key}"], args=[lease_id, limit, ttl, time.time()])
+        return bool(acquired)
+
+    async def release_lease(self, key: str, lease_id: str):
+        await self.client.zrem(f"leases:{key}", lease_id)
+
+_store = None
+
+def get_rate_limit_store() -> RateLimitStore:
+    """Get the configured rate limit store"""
+    global _store
+    if _store is None:
+        if RATE_LIMIT_BACKEND == "redis":
+            _store = RedisRateLimitStore()
+        elif RATE_LIMIT_BACKEND == "memory":
+            _store = MemoryRateLimitStore()
+        else:
+            raise ValueError(f"Unknown rate limit backend: {RATE_LIMIT_BACKEND}")
+    return _store
+
+def _too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+def client_address(request: Request) -> str:
+    """The caller's IP; behind a proxy run uvicorn with --proxy-headers so this is the real client"""
+    return request.client.host if request.client else "unknown"
+
+async def _consume_or_raise(key: str, burst: float, per_minute: float, detail: str):
+    wait = await get_rate_limit_store().consume(key, burst, per_minute / 60)
+    if wait > 0:
+        raise _too_many_requests(detail, wait)
+
+async def check_stream_rate_limit_service(current_user: dict, address: str):
+    """Spend one token from the user's and the address's stream buckets or raise 429"""
+    await _consume_or_raise(
+        f"stream:ip:{address}",
+        STREAM_IP_RATE_LIMIT_BURST,
+        STREAM_IP_RATE_LIMIT_PER_MINUTE,
+        "Too many requests from this address, please slow down",
+    )
+    await _consume_or_raise(
+        f"stream:{current_user['id']}",
+        STREAM_RATE_LIMIT_BURST,
+        STREAM_RATE_LIMIT_PER_MINUTE,
+        "Too many requests, please slow down",
+    )
+
+async def check_login_rate_limit_service(address: str):
+    """Spend one token from the address's login bucket or raise 429"""
+    await _consume_or_raise(
+        f"login:ip:{address}",
+        LOGIN_RATE_LIMIT_BURST,
+        LOGIN_RATE_LIMIT_PER_MINUTE,
+        "Too many login attempts, please try again later",
+    )
+
+async def acquire_stream_lease(current_user: dict) -> str:
+    """
+    Reserve one of the user's concurrent stream slots or raise 429.
+    The returned lease id must be passed to release_stream_lease when the
+    stream ends; leases that are never released expire after STREAM_LEASE_TTL.
+    """
+    lease_id = uuid.uuid4().hex
+    acquired = await get_rate_limit_store().acquire_lease(
+        f"streams:{current_user['id']}", lease_id, STREAM_MAX_CONCURRENT, STREAM_LEASE_TTL
+    )
+    if not acquired:
+        raise _too_many_requests("Too many concurrent streams, wait for one to finish", 1)
+    return lease_id
+
+async def release_stream_lease(current_user: dict, lease_id: str):
+    await get_rate_limit_store().release_lease(f"streams:{current_user['id']}", lease_id)
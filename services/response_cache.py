@@ -0,0 +1,118 @@
+"""
+Cache of agent answers for questions asked at the start of a chat.
+
+Without chat history an answer depends only on the question, so repeated
+questions can skip the ReAct loop. Lookups match the normalized question
+exactly and, when an embedding model is configured, also match reworded
+questions by cosine similarity.
+"""
+import asyncio
+import re
+import threading
+from functools import lru_cache
+from typing import Callable, List, Optional
+import numpy as np
+from constants import (
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_EMBEDDING_MODEL,
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+)
+from services.cache import TTLCache
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip("?!. ")
+
+class ResponseCache:
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self._entries = TTLCache(maxsize, ttl)
+        self.similarity_threshold = similarity_threshold
+        self._embed = lru_cache(maxsize=256)(self._normalized_embedding) if embed else None
+        self._embed_model = embed
+        self._embed_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bypassed = 0
+
+    def _normalized_embedding(self, key: str) -> np.ndarray:
+        # Lookups run on any to_thread worker, but a llama context is not thread-safe
+        with self._embed_lock:
+            vector = np.asarray(self._embed_model(key), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Cached answer for the question, or None"""
+        key = normalize_question(question)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._count("exact_hits")
+            return entry["answer"]
+        if self._embed is not None:
+            query = self._embed(key)
+            best, best_score = None, self.similarity_threshold
+            for _, candidate in self._entries.items():
+                score = float(np.dot(query, candidate["embedding"]))
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is not None:
+                self._count("similar_hits")
+                return best["answer"]
+        self._count("misses")
+        return None
+
+    def store(self, question: str, answer: str):
+        key = normalize_question(question)
+        embedding = self._embed(key) if self._embed is not None else None
+        self._entries.set(key, {"answer": answer, "embedding": embedding})
+        self._count("stores")
+
+    def record_bypass(self):
+        """Count an answer left uncached because it used a tool with side effects"""
+        self._count("bypassed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries.items()),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "bypassed": self.bypassed,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "similarity": self._embed is not None,
+            }
+
+_response_cache = None
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        embed = None
+        if RESPONSE_CACHE_EMBEDDING_MODEL:
+            from langchain_community.embeddings import LlamaCppEmbeddings
+            embed = LlamaCppEmbeddings(model_path=RESPONSE_CACHE_EMBEDDING_MODEL).embed_query
+        _response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, embed)
+    return _response_cache
+
+async def lookup_cached_response(question: str) -> Optional[str]:
+    # Embedding the question is CPU work, keep it off the event loop
+    return await asyncio.to_thread(get_response_cache().lookup, question)
+
+async def store_cached_response(question: str, answer: str):
+    await asyncio.to_thread(get_response_cache().store, question, answer)
@@ -0,0 +1,371 @@
+"""SQLite implementation of the storage backend"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+from services.database import (
+    get_db_connection_service,
+    get_db_write_connection_service,
+    get_pool_stats,
+    close_database_pool,
+    initialize_database,
+    run_db,
+)
+from services.storage import StorageBackend
+
+MAX_ROW_ID = 2 ** 63 - 1
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+class SQLiteStorage(StorageBackend):
+    """Single-file storage; blocking calls run on the database executor"""
+
+    async def initialize(self):
+        await run_db(initialize_database)
+
+    async def close(self):
+        close_database_pool()
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", **get_pool_stats()}
+
+    # Chats
+
+    async def create_chat(self, user_id: int, title: str) -> int:
+        return await run_db(self._create_chat, user_id, title)
+
+    def _create_chat(self, user_id: int, title: str) -> int:
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('INSERT INTO chats (user_id, title) VALUES (?, ?)', (user_id, title))
+            return c.lastrowid
+
+    async def get_chat(self, chat_id: int) -> Optional[dict]:
+        return await run_db(self._get_chat, chat_id)
+
+    def _get_chat(self, chat_id: int) -> Optional[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('SELECT id, title, created_at, user_id FROM chats WHERE id = ?', (chat_id,))
+            row = c.fetchone()
+        return dict(row) if row else None
+
+    async def user_owns_chat(self, chat_id: int, user_id: int) -> bool:
+        return await run_db(self._user_owns_chat, chat_id, user_id)
+
+    def _user_owns_chat(self, chat_id: int, user_id: int) -> bool:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('SELECT id FROM chats WHERE id = ? AND user_id = ?', (chat_id, user_id))
+            return c.fetchone() is not None
+
+    async def delete_chat(self, chat_id: int, user_id: int) -> bool:
+        return await run_db(self._delete_chat, chat_id, user_id)
+
+    def _delete_chat(self, chat_id: int, user_id: int) -> bool:
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('SELECT id FROM chats WHERE id = ? AND user_id = ?', (chat_id, user_id))
+            if not c.fetchone():
+                return False
+            c.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
+            c.execute('DELETE FROM chat_summaries WHERE chat_id = ?', (chat_id,))
+            c.execute('DELETE FROM audio_files WHERE chat_id = ?', (chat_id,))
+            c.execute('DELETE FROM chats WHERE id = ?', (chat_id,))
+            return True
+
+    async def list_chats(self, user_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        return await run_db(self._list_chats, user_id, before_id, after_id, limit)
+
+    def _list_chats(self, user_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            if after_id is not None:
+                c.execute('''
+                    SELECT id, title, created_at, user_id
+                    FROM chats
+                    WHERE user_id = ? AND id > ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                ''', (user_id, after_id, limit))
+            else:
+                c.execute('''
+                    SELECT id, title, created_at, user_id
+                    FROM chats
+                    WHERE user_id = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                ''', (user_id, before_id if before_id is not None else MAX_ROW_ID, limit))
+            return [dict(row) for row in c.fetchall()]
+
+    # Messages
+
+    async def add_message(self, chat_id: int, content: str, is_human: bool, image_id: Optional[str] = None) -> int:
+        return await run_db(self._add_message, chat_id, content, is_human, image_id)
+
+    def _add_message(self, chat_id: int, content: str, is_human: bool, image_id: Optional[str]) -> int:
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                INSERT INTO messages (chat_id, content, is_human, image_id)
+                VALUES (?, ?, ?, ?)
+            ''', (chat_id, content, is_human, image_id))
+            return c.lastrowid
+
+    async def list_messages(self, chat_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        return await run_db(self._list_messages, chat_id, before_id, after_id, limit)
+
+    def _list_messages(self, chat_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            if after_id is not None:
+                c.execute('''
+                    SELECT id, chat_id, content, is_human, image_id, created_at
+                    FROM messages
+                    WHERE chat_id = ? AND id > ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                ''', (chat_id, after_id, limit))
+            else:
+                c.execute('''
+                    SELECT id, chat_id, content, is_human, image_id, created_at
+                    FROM messages
+                    WHERE chat_id = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                ''', (chat_id, before_id if before_id is not None else MAX_ROW_ID, limit))
+            return [dict(row) for row in c.fetchall()]
+
+    async def get_recent_messages(self, chat_id: int, limit: int) -> List[dict]:
+        return await run_db(self._get_recent_messages, chat_id, limit)
+
+    def _get_recent_messages(self, chat_id: int, limit: int) -> List[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                SELECT id, content, is_human, token_count
+                FROM messages
+                WHERE chat_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (chat_id, limit))
+            messages = c.fetchall()
+        return [dict(msg) for msg in reversed(messages)]
+
+    async def set_message_token_counts(self, counts: List[Tuple[int, int]]):
+        await run_db(self._set_message_token_counts, counts)
+
+    def _set_message_token_counts(self, counts: List[Tuple[int, int]]):
+        with get_db_write_connection_service() as db:
+            db.executemany(
+                'UPDATE messages SET token_count = ? WHERE id = ?',
+                [(token_count, message_id) for message_id, token_count in counts]
+            )
+
+    async def get_last_ai_message(self, chat_id: int) -> Optional[dict]:
+        return await run_db(self._get_last_ai_message, chat_id)
+
+    def _get_last_ai_message(self, chat_id: int) -> Optional[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                SELECT id, chat_id, content, is_human, image_id, created_at
+                FROM messages
+                WHERE chat_id = ? AND is_human = 0
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (chat_id,))
+            row = c.fetchone()
+        return dict(row) if row else None
+
+    async def user_owns_image(self, image_id: str, user_id: int) -> bool:
+        return await run_db(self._user_owns_image, image_id, user_id)
+
+    def _user_owns_image(self, image_id: str, user_id: int) -> bool:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                SELECT 1
+                FROM messages m
+                JOIN chats ch ON m.chat_id = ch.id
+                WHERE m.image_id = ? AND ch.user_id = ?
+            ''', (image_id, user_id))
+            return c.fetchone() is not None
+
+    # Audio files
+
+    async def add_audio_file(self, audio_id: str, user_id: int, chat_id: Optional[int], audio_format: str, data: bytes):
+        await run_db(self._add_audio_file, audio_id, user_id, chat_id, audio_format, data)
+
+    def _add_audio_file(self, audio_id: str, user_id: int, chat_id: Optional[int], audio_format: str, data: bytes):
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute(
+                'INSERT INTO audio_files (id, user_id, chat_id, format, data) VALUES (?, ?, ?, ?, ?)',
+                (audio_id, user_id, chat_id, audio_format, data)
+            )
+
+    async def get_user_audio_file(self, audio_id: str, user_id: int) -> Optional[dict]:
+        return await run_db(self._get_user_audio_file, audio_id, user_id)
+
+    def _get_user_audio_file(self, audio_id: str, user_id: int) -> Optional[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute(
+                'SELECT id, chat_id, format, data, created_at FROM audio_files WHERE id = ? AND user_id = ?',
+                (audio_id, user_id)
+            )
+            row = c.fetchone()
+        return dict(row) if row else None
+
+    async def delete_audio_files_older_than(self, max_age: float) -> int:
+        return await run_db(self._delete_audio_files_older_than, max_age)
+
+    def _delete_audio_files_older_than(self, max_age: float) -> int:
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute("DELETE FROM audio_files WHERE created_at < datetime('now', ?)", (f"-{int(max_age)} seconds",))
+            return c.rowcount
+
+    # Chat summaries
+
+    async def get_chat_summary(self, chat_id: int) -> Optional[dict]:
+        return await run_db(self._get_chat_summary, chat_id)
+
+    def _get_chat_summary(self, chat_id: int) -> Optional[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('SELECT summary, last_message_id FROM chat_summaries WHERE chat_id = ?', (chat_id,))
+            row = c.fetchone()
+        return dict(row) if row else None
+
+    async def save_chat_summary(self, chat_id: int, summary: str, last_message_id: int):
+        await run_db(self._save_chat_summary, chat_id, summary, last_message_id)
+
+    def _save_chat_summary(self, chat_id: int, summary: str, last_message_id: int):
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                INSERT OR REPLACE INTO chat_summaries (chat_id, summary, last_message_id, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (chat_id, summary, last_message_id))
+
+    # Users
+
+    async def get_user_by_email(self, email: str) -> Optional[dict]:
+        return await run_db(self._get_user, 'email', email)
+
+    async def get_user_by_id(self, user_id: int) -> Optional[dict]:
+        return await run_db(self._get_user, 'id', user_id)
+
+    def _get_user(self, column: str, value) -> Optional[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute(f'SELECT * FROM users WHERE {column} = ?', (value,))
+            user = c.fetchone()
+        return dict(user) if user else None
+
+    async def create_user(self, email: str, password_hash: str, is_temporary_password: bool = True) -> int:
+        return await run_db(self._create_user, email, password_hash, is_temporary_password)
+
+    def _create_user(self, email: str, password_hash: str, is_temporary_password: bool) -> int:
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                INSERT INTO users (email, password_hash, is_temporary_password)
+                VALUES (?, ?, ?)
+            ''', (email, password_hash, is_temporary_password))
+            return c.lastrowid
+
+    async def list_users(self) -> List[dict]:
+        return await run_db(self._list_users)
+
+    def _list_users(self) -> List[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('SELECT id, email, created_at, is_temporary_password, is_admin FROM users')
+            return [dict(row) for row in c.fetchall()]
+
+    async def delete_user(self, user_id: int) -> bool:
+        return await run_db(self._delete_user, user_id)
+
+    def _delete_user(self, user_id: int) -> bool:
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('DELETE FROM users WHERE id = ? AND is_admin = FALSE', (user_id,))
+            if c.rowcount == 0:
+                return False
+            # No PRAGMA foreign_keys, so the ON DELETE CASCADE is not enforced
+            c.execute('DELETE FROM audio_files WHERE user_id = ?', (user_id,))
+            return True
+
+    async def update_password(self, user_id: int, password_hash: str):
+        await run_db(self._update_password, user_id, password_hash)
+
+    def _update_password(self, user_id: int, password_hash: str):
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                UPDATE users
+                SET password_hash = ?, is_temporary_password = FALSE
+                WHERE id = ?
+            ''', (password_hash, user_id))
+
+    async def update_password_hash(self, user_id: int, password_hash: str):
+        await run_db(self._update_password_hash, user_id, password_hash)
+
+    def _update_password_hash(self, user_id: int, password_hash: str):
+        with get_db_write_connection_service() as db:
+            db.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+
+    # Password reset tokens
+
+    async def create_reset_token(self, user_id: int, token: str, expires_at: datetime):
+        await run_db(self._create_reset_token, user_id, token, expires_at)
+
+    def _create_reset_token(self, user_id: int, token: str, expires_at: datetime):
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                INSERT OR REPLACE INTO password_reset_tokens
+                (user_id, token, expires_at, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, token, expires_at, datetime.utcnow()))
+
+    async def get_reset_token(self, token: str) -> Optional[dict]:
+        return await run_db(self._get_reset_token, token)
+
+    def _get_reset_token(self, token: str) -> Optional[dict]:
+        with get_db_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                SELECT prt.id, prt.user_id, prt.expires_at, prt.used_at, u.email
+                FROM password_reset_tokens prt
+                JOIN users u ON prt.user_id = u.id
+                WHERE prt.token = ?
+            ''', (token,))
+            row = c.fetchone()
+        if not row:
+            return None
+        token_data = dict(row)
+        token_data['expires_at'] = _parse_datetime(token_data['expires_at'])
+        token_data['used_at'] = _parse_datetime(token_data['used_at'])
+        return token_data
+
+    async def complete_password_reset(self, token_id: int, user_id: int, password_hash: str):
+        await run_db(self._complete_password_reset, token_id, user_id, password_hash)
+
+    def _complete_password_reset(self, token_id: int, user_id: int, password_hash: str):
+        with get_db_write_connection_service() as db:
+            c = db.cursor()
+            c.execute('''
+                UPDATE users
+                SET password_hash = ?, is_temporary_password = FALSE
+                WHERE id = ?
+            ''', (password_hash, user_id))
+            c.execute('''
+                UPDATE password_reset_tokens
+                SET used_at = ?
+                WHERE id = ?
+            ''', (datetime.utcnow(), token_id))
@@ -0,0 +1,17 @@
+from services.storage import get_storage
+from services.auth import get_auth_cache_stats
+from services.llm_scheduler import get_llm_scheduler
+from services.llm_state import get_llm_state_cache
+from services.response_cache import get_response_cache
+from services.broker import get_broker_client
+
+async def get_stats_service(admin_user: dict):
+    """Collect runtime performance counters for the admin dashboard"""
+    return {
+        "database_pool": get_storage().stats(),
+        **get_auth_cache_stats(),
+        "llm_scheduler": get_llm_scheduler().stats(),
+        "llm_state_cache": get_llm_state_cache().stats(),
+        "response_cache": get_response_cache().stats(),
+        "broker": get_broker_client().stats(),
+    }
@@ -0,0 +1,160 @@
+"""Storage backend interface for chats, messages, users and reset tokens"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional, Tuple
+from constants import STORAGE_BACKEND
+
+class StorageBackend(ABC):
+    """
+    Repository interface used by every service.
+    Listing methods return rows in keyset order (id descending, or id
+    ascending when after_id is given) and never more than limit rows;
+    paging decisions are left to the caller.
+    """
+
+    @abstractmethod
+    async def initialize(self):
+        """Apply migrations and seed the admin user"""
+
+    @abstractmethod
+    async def close(self):
+        """Release pooled connections"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Connection pool counters"""
+
+    # Chats
+
+    @abstractmethod
+    async def create_chat(self, user_id: int, title: str) -> int:
+        ...
+
+    @abstractmethod
+    async def get_chat(self, chat_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def user_owns_chat(self, chat_id: int, user_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete_chat(self, chat_id: int, user_id: int) -> bool:
+        """Delete a chat and its messages, returning False if the user has no such chat"""
+
+    @abstractmethod
+    async def list_chats(self, user_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        ...
+
+    # Messages
+
+    @abstractmethod
+    async def add_message(self, chat_id: int, content: str, is_human: bool, image_id: Optional[str] = None) -> int:
+        ...
+
+    @abstractmethod
+    async def list_messages(self, chat_id: int, before_id: Optional[int], after_id: Optional[int], limit: int) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def get_recent_messages(self, chat_id: int, limit: int) -> List[dict]:
+        """Latest messages of a chat (id, content, is_human, token_count), oldest first"""
+
+    @abstractmethod
+    async def set_message_token_counts(self, counts: List[Tuple[int, int]]):
+        """Memoize (message_id, token_count) pairs"""
+
+    @abstractmethod
+    async def get_last_ai_message(self, chat_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def user_owns_image(self, image_id: str, user_id: int) -> bool:
+        ...
+
+    # Audio files
+
+    # Audio is kept in the database so every API node can serve it; it goes
+    # with its chat or user
+
+    @abstractmethod
+    async def add_audio_file(self, audio_id: str, user_id: int, chat_id: Optional[int], audio_format: str, data: bytes):
+        ...
+
+    @abstractmethod
+    async def get_user_audio_file(self, audio_id: str, user_id: int) -> Optional[dict]:
+        """The audio file, bytes included, if it belongs to the user"""
+
+    @abstractmethod
+    async def delete_audio_files_older_than(self, max_age: float) -> int:
+        """Delete audio created more than max_age seconds ago and return how many went"""
+
+    # Chat summaries
+
+    @abstractmethod
+    async def get_chat_summary(self, chat_id: int) -> Optional[dict]:
+        """Summary and the id of the last message folded into it"""
+
+    @abstractmethod
+    async def save_chat_summary(self, chat_id: int, summary: str, last_message_id: int):
+        ...
+
+    # Users
+
+    @abstractmethod
+    async def get_user_by_email(self, email: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def get_user_by_id(self, user_id: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def create_user(self, email: str, password_hash: str, is_temporary_password: bool = True) -> int:
+        ...
+
+    @abstractmethod
+    async def list_users(self) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def delete_user(self, user_id: int) -> bool:
+        """Delete a non-admin user, returning False if nothing was deleted"""
+
+    @abstractmethod
+    async def update_password(self, user_id: int, password_hash: str):
+        """Store a new password hash and clear the temporary-password flag"""
+
+    @abstractmethod
+    async def update_password_hash(self, user_id: int, password_hash: str):
+        """Replace the stored hash only, e.g. when upgrading its algorithm"""
+
+    # Password reset tokens
+
+    @abstractmethod
+    async def create_reset_token(self, user_id: int, token: str, expires_at: datetime):
+        ...
+
+    @abstractmethod
+    async def get_reset_token(self, token: str) -> Optional[dict]:
+        """Token row joined with the user's email; expires_at and used_at are datetimes"""
+
+    @abstractmethod
+    async def complete_password_reset(self, token_id: int, user_id: int, password_hash: str):
+        """Atomically update the password and mark the token as used"""
+
+_storage = None
+
+def get_storage() -> StorageBackend:
+    """Get the configured storage backend"""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "postgres":
+            from services.postgres_storage import PostgresStorage
+            _storage = PostgresStorage()
+        elif STORAGE_BACKEND == "sqlite":
+            from services.sqlite_storage import SQLiteStorage
+            _storage = SQLiteStorage()
+        else:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+    return _storage
@@ -1,5 +1,6 @@
-from services.database import get_db_connection_service
-from services.auth import generate_temporary_password, hash_password, generate_reset_token
+from services.storage import get_storage
+from services.auth import generate_temporary_password, generate_reset_token, invalidate_user_cache
+from services.passwords import hash_password
 from models import UserCreate
 from fastapi import HTTPException, status
 from dependencies import mailjet
@@ -91,24 +92,18 @@ def send_password_reset_email(email: str, reset_token: str):
         return False
 
 async def create_user_service(user_create: UserCreate, admin_user: dict):
-    db = get_db_connection_service()
-    c = db.cursor()
+    storage = get_storage()
     
-    c.execute('SELECT * FROM users WHERE email = ?', (user_create.email,))
-    if c.fetchone():
+    if await storage.get_user_by_email(user_create.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exists"
         )
     
     temp_password = generate_temporary_password()
-    password_hash = hash_password(temp_password)
+    password_hash = await hash_password(temp_password)
     
-    c.execute('''
-        INSERT INTO users (email, password_hash, is_temporary_password) 
-        VALUES (?, ?, TRUE)
-    ''', (user_create.email, password_hash))
-    db.commit()
+    await storage.create_user(user_create.email, password_hash, is_temporary_password=True)
     
     email_sent = send_welcome_email(user_create.email, temp_password)
     
@@ -120,11 +115,8 @@ async def create_user_service(user_create: UserCreate, admin_user: dict):
 
 async def forgot_password_service(email: str):
     """Handle forgot password request"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    
-    c.execute('SELECT id FROM users WHERE email = ?', (email,))
-    user = c.fetchone()
+    storage = get_storage()
+    user = await storage.get_user_by_email(email)
     
     if not user:
         return {"message": "If the email exists, a password reset link has been sent"}
@@ -132,12 +124,7 @@ async def forgot_password_service(email: str):
     reset_token = generate_reset_token()
     expires_at = datetime.utcnow() + timedelta(hours=1)
     
-    c.execute('''
-        INSERT OR REPLACE INTO password_reset_tokens 
-        (user_id, token, expires_at, created_at) 
-        VALUES (?, ?, ?, ?)
-    ''', (user['id'], reset_token, expires_at, datetime.utcnow()))
-    db.commit()
+    await storage.create_reset_token(user['id'], reset_token, expires_at)
     
     send_password_reset_email(email, reset_token)
     
@@ -146,47 +133,32 @@ async def forgot_password_service(email: str):
     }
 
 async def list_users_service(admin_user: dict):
-    db = get_db_connection_service()
-    c = db.cursor()
-    c.execute('SELECT id, email, created_at, is_temporary_password, is_admin FROM users')
-    users = [dict(row) for row in c.fetchall()]
+    users = await get_storage().list_users()
     return {"users": users}
 
 async def delete_user_service(user_id: int, admin_user: dict):
-    db = get_db_connection_service()
-    c = db.cursor()
+    storage = get_storage()
     
-    c.execute('SELECT is_admin FROM users WHERE id = ?', (user_id,))
-    user = c.fetchone()
+    user = await storage.get_user_by_id(user_id)
     if user and user['is_admin']:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete admin users"
         )
     
-    c.execute('DELETE FROM users WHERE id = ? AND is_admin = FALSE', (user_id,))
-    if c.rowcount == 0:
+    if not await storage.delete_user(user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found or cannot be deleted"
         )
-    db.commit()
+    invalidate_user_cache(user['email'])
     
     return {"message": "User deleted successfully"}
 
 async def reset_password_service(token: str, new_password: str):
     """Reset password using token"""
-    db = get_db_connection_service()
-    c = db.cursor()
-    
-    c.execute('''
-        SELECT prt.id, prt.user_id, prt.expires_at, prt.used_at, u.email 
-        FROM password_reset_tokens prt
-        JOIN users u ON prt.user_id = u.id
-        WHERE prt.token = ?
-    ''', (token,))
-    
-    token_data = c.fetchone()
+    storage = get_storage()
+    token_data = await storage.get_reset_token(token)
     
     if not token_data:
         raise HTTPException(
@@ -194,7 +166,7 @@ async def reset_password_service(token: str, new_password: str):
             detail="Invalid reset token"
         )
     
-    if datetime.utcnow() > datetime.fromisoformat(token_data['expires_at']):
+    if datetime.utcnow() > token_data['expires_at']:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Reset token has expired"
@@ -206,20 +178,8 @@ async def reset_password_service(token: str, new_password: str):
             detail="Reset token has already been used"
         )
     
-    password_hash = hash_password(new_password)
-    
-    c.execute('''
-        UPDATE users 
-        SET password_hash = ?, is_temporary_password = FALSE 
-        WHERE id = ?
-    ''', (password_hash, token_data['user_id']))
-    
-    c.execute('''
-        UPDATE password_reset_tokens 
-        SET used_at = ? 
-        WHERE id = ?
-    ''', (datetime.utcnow(), token_data['id']))
-    
-    db.commit()
+    password_hash = await hash_password(new_password)
+    await storage.complete_password_reset(token_data['id'], token_data['user_id'], password_hash)
+    invalidate_user_cache(token_data['email'])
     
     return {"message": "Password reset successfully"}
\ No newline at end of file
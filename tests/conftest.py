@@ -0,0 +1,123 @@
+"""
+Shared test fixtures.
+
+The real dependencies module loads the GGUF model and a Mailjet client at
+import time, so a stand-in is installed before any service is imported.
+"""
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import types
+import numpy as np
+import pytest
+
+class FakeLlamaClient:
+    """llama_cpp.Llama stand-in: one token per whitespace-separated word"""
+
+    def tokenize(self, text: bytes, add_bos: bool = False):
+        return text.split()
+
+    def detokenize(self, tokens) -> bytes:
+        return b" ".join(tokens)
+
+    def save_state(self):
+        return types.SimpleNamespace(llama_state_size=0, scores=np.zeros(0), input_ids=np.zeros(0))
+
+    def load_state(self, state):
+        pass
+
+class FakeLLM:
+    client = FakeLlamaClient()
+
+    def invoke(self, prompt: str, **kwargs) -> str:
+        return "Summary of the conversation."
+
+sys.modules["dependencies"] = types.SimpleNamespace(llm=FakeLLM(), mailjet=None, security=None)
+
+@pytest.fixture(autouse=True)
+def secret_key(monkeypatch):
+    """constants.SECRET_KEY is empty in the repo; tokens need a key to sign with"""
+    import services.auth as auth
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret-key")
+
+@pytest.fixture
+def sqlite_storage(tmp_path, monkeypatch):
+    """A SQLite backend on a fresh database file, not yet initialized"""
+    import services.database as database
+    import services.storage as storage
+    monkeypatch.setattr(database, "DATABASE_DIR", str(tmp_path))
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(database, "_pool", None)
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(storage, "_storage", None)
+    return storage.get_storage()
+
+@pytest.fixture(scope="session")
+def postgres_server_dsn():
+    """
+    DSN of a PostgreSQL server: TEST_POSTGRES_DSN if set, otherwise an
+    embedded server from pgserver. Skips when neither is available.
+    """
+    dsn = os.environ.get("TEST_POSTGRES_DSN")
+    if dsn:
+        yield dsn
+        return
+    pgserver = pytest.importorskip("pgserver")
+    with tempfile.TemporaryDirectory() as pgdata:
+        server = pgserver.get_server(pgdata, cleanup_mode="stop")
+        yield server.get_uri()
+        server.cleanup()
+
+_database_names = itertools.count()
+
+@pytest.fixture
+def postgres_storage(postgres_server_dsn):
+    """A PostgreSQL backend on a freshly created database, not yet initialized"""
+    asyncpg = pytest.importorskip("asyncpg")
+    from services.postgres_storage import PostgresStorage
+    name = f"test_{os.getpid()}_{next(_database_names)}"
+
+    async def execute(statement):
+        conn = await asyncpg.connect(postgres_server_dsn)
+        try:
+            await conn.execute(statement)
+        finally:
+            await conn.close()
+
+    asyncio.run(execute(f'CREATE DATABASE "{name}"'))
+    base, _, query = postgres_server_dsn.partition("?")
+    dsn = base.rsplit("/", 1)[0] + "/" + name + ("?" + query if query else "")
+    yield PostgresStorage(dsn)
+    asyncio.run(execute(f'DROP DATABASE "{name}"'))
+
+@pytest.fixture
+def run_with_storage():
+    """
+    Run scenario(backend) on a new event loop with the backend initialized
+    and closed on that same loop, as asyncpg pools are bound to their loop.
+    """
+    def run(backend, scenario):
+        async def main():
+            await backend.initialize()
+            try:
+                return await scenario(backend)
+            finally:
+                await backend.close()
+        return asyncio.run(main())
+    return run
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.001) -> list:
+    """Sleep interval repeatedly until stop is set and return how late each wake-up was"""
+    loop = asyncio.get_running_loop()
+    lags = []
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+    return lags
+
+@pytest.fixture
+def loop_lag():
+    return measure_loop_lag
@@ -0,0 +1,119 @@
+import asyncio
+import pytest
+from faststream.rabbit import RabbitBroker, TestRabbitBroker
+from faststream.rabbit.annotations import RabbitMessage
+import services.broker as broker_module
+from services.broker import BrokerClient, BrokerUnavailable, STREAM_CHUNK_HEADER
+
+def make_client():
+    broker = RabbitBroker("amqp://localhost")
+    client = BrokerClient(broker)
+
+    @broker.subscriber("echo")
+    async def echo(body: dict):
+        # Later requests finish first, so replies come back out of order
+        await asyncio.sleep(0.01 * (5 - body["n"]))
+        return {"n": body["n"]}
+
+    @broker.subscriber("chunks")
+    async def chunks(body: dict, message: RabbitMessage):
+        # Publishes the chunks in the order asked for, as if RabbitMQ had reordered or lost some
+        order = body.get("order", list(range(body["count"])))
+        for i in order:
+            await broker.publish(
+                {"index": i},
+                queue=message.reply_to,
+                correlation_id=message.correlation_id,
+                headers={STREAM_CHUNK_HEADER: str(i)},
+            )
+        return {"chunks": body["count"]}
+
+    @broker.subscriber("failing")
+    async def failing(body: dict):
+        return {"error": "synthesis failed"}
+
+    return broker, client
+
+def run_connected(scenario):
+    async def main():
+        broker, client = make_client()
+        async with TestRabbitBroker(broker):
+            await client.start()
+            await asyncio.wait_for(client._connected.wait(), 1)
+            return await scenario(client)
+    return asyncio.run(main())
+
+def test_rpc_replies_are_matched_by_correlation_id():
+    async def scenario(client):
+        return await asyncio.gather(*(client.rpc("echo", {"n": n}, timeout=1) for n in range(5)))
+
+    assert run_connected(scenario) == [{"n": n} for n in range(5)]
+
+def test_stream_yields_chunks_in_order_until_the_final_reply():
+    async def scenario(client):
+        received = [chunk async for chunk in client.stream("chunks", {"count": 4}, timeout=1)]
+        return received, client.stats()
+
+    received, stats = run_connected(scenario)
+
+    assert received == [{"index": i} for i in range(4)]
+    assert stats["in_flight"] == 0
+
+def test_stream_puts_reordered_chunks_back_in_sequence():
+    async def scenario(client):
+        payload = {"count": 5, "order": [1, 0, 4, 2, 3]}
+        return [chunk async for chunk in client.stream("chunks", payload, timeout=1)]
+
+    assert run_connected(scenario) == [{"index": i} for i in range(5)]
+
+def test_stream_fails_on_a_missing_chunk(monkeypatch):
+    monkeypatch.setattr(broker_module, "BROKER_STREAM_GAP_WAIT", 0.05)
+
+    async def scenario(client):
+        received = []
+        with pytest.raises(RuntimeError, match="chunk 2 of 4"):
+            async for chunk in client.stream("chunks", {"count": 4, "order": [0, 1, 3]}, timeout=1):
+                received.append(chunk)
+        return received, client.stats()
+
+    received, stats = run_connected(scenario)
+
+    # Nothing after the gap is handed out
+    assert received == [{"index": 0}, {"index": 1}]
+    assert stats["in_flight"] == 0
+
+def test_stream_raises_the_workers_error():
+    async def scenario(client):
+        with pytest.raises(RuntimeError, match="synthesis failed"):
+            async for _ in client.stream("failing", {}, timeout=1):
+                pass
+
+    run_connected(scenario)
+
+def test_rpc_times_out_when_no_worker_replies():
+    async def scenario(client):
+        with pytest.raises(asyncio.TimeoutError):
+            await client.rpc("nobody-listens", {}, timeout=0.1)
+        return client.stats()
+
+    stats = run_connected(scenario)
+
+    assert stats["timeouts"] == 1
+    assert stats["in_flight"] == 0
+
+def test_calls_fail_fast_while_rabbitmq_is_down(monkeypatch):
+    monkeypatch.setattr(broker_module, "BROKER_CONNECT_WAIT", 0.05)
+
+    async def scenario():
+        # Never started, as when every connection attempt has failed so far
+        _, client = make_client()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(BrokerUnavailable):
+            await client.rpc("echo", {"n": 0})
+        with pytest.raises(BrokerUnavailable):
+            async for _ in client.stream("chunks", {"count": 1}):
+                pass
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) < 0.5
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import services.database as database
+from services.chats import get_chats_service
+from services.passwords import hash_password_sync
+
+CONCURRENT_REQUESTS = 200
+SLOW_READ = 0.01
+MAX_P99_LAG = 0.005
+
+def test_event_loop_stays_responsive_under_concurrent_chat_lists(sqlite_storage, run_with_storage, loop_lag, monkeypatch):
+    """
+    Each pooled read is held for SLOW_READ, as on a cold page cache. Run on the
+    event loop, 200 such reads would stall it for two seconds; through the
+    database executor the loop keeps waking on time.
+    """
+    acquire = database.ConnectionPool.acquire
+
+    def slow_acquire(pool):
+        conn = acquire(pool)
+        time.sleep(SLOW_READ)
+        return conn
+
+    async def scenario(storage):
+        user_id = await storage.create_user("user@example.com", hash_password_sync("password"), False)
+        for i in range(5000):
+            await storage.create_chat(user_id, f"Chat {i}")
+        current_user = {"id": user_id}
+        monkeypatch.setattr(database.ConnectionPool, "acquire", slow_acquire)
+
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(loop_lag(stop))
+        pages = await asyncio.gather(*(
+            get_chats_service(current_user, limit=50) for _ in range(CONCURRENT_REQUESTS)
+        ))
+        stop.set()
+        return pages, await monitor
+
+    pages, lags = run_with_storage(sqlite_storage, scenario)
+
+    assert all(len(page["items"]) == 50 for page in pages)
+    assert len(lags) >= 100
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)]
+    assert p99 < MAX_P99_LAG, f"p99 event loop lag {p99 * 1000:.1f} ms"
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from services.llm_scheduler import LLMScheduler, PRIORITY_HIGH, PRIORITY_LOW
+
+async def fake_generation(scheduler: LLMScheduler, ticket, served: list, seconds: float = 0.01):
+    """Wait for a slot, hold it like a model call, then give it back"""
+    try:
+        async for _ in ticket.wait():
+            pass
+        served.append(ticket.user_id)
+        await asyncio.sleep(seconds)
+    finally:
+        scheduler.release(ticket)
+
+def test_users_are_served_round_robin_within_a_priority():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, max_queue=10)
+        served = []
+        tickets = [scheduler.submit(user) for user in ["zed", "alice", "alice", "alice", "bob", "carol"]]
+        admin = scheduler.submit("admin", PRIORITY_HIGH)
+        await asyncio.gather(*(fake_generation(scheduler, ticket, served) for ticket in tickets + [admin]))
+        return served
+
+    # zed was granted the free slot on submit; then the admin, then one turn per user
+    assert asyncio.run(scenario()) == ["zed", "admin", "alice", "bob", "carol", "alice", "alice"]
+
+def test_positions_are_reported_as_the_queue_moves():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, max_queue=10)
+        tickets = [scheduler.submit(user) for user in ["alice", "bob", "carol", "dave"]]
+        positions = []
+
+        async def watch():
+            async for position in tickets[3].wait():
+                positions.append(position)
+                # Slow consumer: the queue moves while it is still writing this position out
+                await asyncio.sleep(0.02)
+
+        watcher = asyncio.create_task(watch())
+        for ticket in tickets[:3]:
+            await asyncio.sleep(0.005 if ticket is tickets[0] else 0.045)
+            scheduler.release(ticket)
+        await watcher
+        return positions
+
+    assert asyncio.run(scenario()) == [3, 2, 1]
+
+def test_full_queue_rejects_interactive_requests_but_not_background_ones():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, max_queue=2, max_background_queue=2)
+        scheduler.submit("alice")
+        scheduler.submit("summary:1", PRIORITY_LOW)
+        scheduler.submit("summary:2", PRIORITY_LOW)
+        scheduler.submit("bob")
+        scheduler.submit("carol")
+        with pytest.raises(HTTPException) as interactive:
+            scheduler.submit("dave")
+        with pytest.raises(HTTPException) as background:
+            scheduler.submit("summary:3", PRIORITY_LOW)
+        return interactive.value, background.value, scheduler.stats()
+
+    interactive, background, stats = asyncio.run(scenario())
+
+    assert interactive.status_code == background.status_code == 503
+    assert stats["waiting"] == 4
+    assert stats["background_waiting"] == 2
+    assert stats["rejected"] == 2
+
+def test_queue_timeout_removes_the_ticket_and_counts_once():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, max_queue=10, queue_timeout=0.05)
+        running = scheduler.submit("alice")
+        waiting = scheduler.submit("bob")
+        with pytest.raises(TimeoutError):
+            async for _ in waiting.wait():
+                pass
+        # Callers still release in a finally block; that must not count again
+        scheduler.release(waiting)
+        scheduler.release(running)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["timeouts"] == 1
+    assert stats["cancelled"] == 0
+    assert stats["waiting"] == 0
+    assert stats["running"] == 0
+
+def test_disconnected_clients_give_up_their_place_and_slot():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, max_queue=10)
+        served = []
+        running = scheduler.submit("alice")
+        leaving = scheduler.submit("bob")
+        staying = scheduler.submit("carol")
+        generation = asyncio.create_task(fake_generation(scheduler, staying, served))
+        waiter = asyncio.create_task(fake_generation(scheduler, leaving, served))
+        await asyncio.sleep(0)
+        # The SSE client goes away while queued, then the running stream ends the same way
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release(running)
+        await generation
+        return served, scheduler.stats()
+
+    served, stats = asyncio.run(scenario())
+
+    assert served == ["carol"]
+    assert stats["cancelled"] == 1
+    assert stats["running"] == 0
+    assert stats["waiting"] == 0
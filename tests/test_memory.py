@@ -0,0 +1,67 @@
+import types
+import numpy as np
+from services.llm_state import LLMStateCache
+from services.memory import build_question_with_history, get_chat_memory, refresh_chat_summary
+
+TURNS = 16
+# Stands in for the agent's system prompt and tool descriptions ahead of the input
+AGENT_PREAMBLE = ["system"] * 300
+
+class FakeModel:
+    """llama_cpp.Llama stand-in that tracks which prompt tokens it could skip"""
+
+    def __init__(self):
+        self.input_ids = []
+
+    def evaluate(self, tokens: list) -> int:
+        """Evaluate a prompt and return how many leading tokens were already in the KV cache"""
+        reused = 0
+        for cached, token in zip(self.input_ids, tokens):
+            if cached != token:
+                break
+            reused += 1
+        self.input_ids = list(tokens)
+        return reused
+
+    def save_state(self):
+        return types.SimpleNamespace(
+            llama_state_size=0, scores=np.zeros(0), input_ids=np.array(self.input_ids, dtype=object)
+        )
+
+    def load_state(self, state):
+        self.input_ids = list(state.input_ids)
+
+def test_follow_up_turns_reuse_the_saved_prompt_prefix(sqlite_storage, run_with_storage):
+    async def scenario(storage):
+        user_id = await storage.create_user("user@example.com", "hash")
+        chat_id = await storage.create_chat(user_id, "Chat")
+        model = FakeModel()
+        states = LLMStateCache(capacity_bytes=1)
+        states.capacity_bytes = float("inf")
+        turns = []
+        for turn in range(TURNS):
+            question = f"question {turn} " + "word " * 40
+            answer = f"answer {turn} " + "word " * 150
+            prompt = AGENT_PREAMBLE + build_question_with_history(question, await get_chat_memory(chat_id)).split()
+            # Another chat used the model in between
+            model.input_ids = ["other", "chat"]
+            states.restore(model, chat_id)
+            reused = model.evaluate(prompt)
+            model.input_ids += answer.split()
+            states.save(model, chat_id)
+            await storage.add_message(chat_id, question, True)
+            await storage.add_message(chat_id, answer, False)
+            refreshed = await refresh_chat_summary(chat_id) is not None
+            turns.append((reused, len(prompt), refreshed))
+        return turns
+
+    turns = run_with_storage(sqlite_storage, scenario)
+
+    refreshes = sum(refreshed for _, _, refreshed in turns)
+    assert 0 < refreshes <= TURNS // 3
+    # The first prompt had no history section, so only the preamble carries over
+    assert turns[1][0] == len(AGENT_PREAMBLE)
+    for (_, previous_length, refreshed), (reused, length, _) in zip(turns[1:], turns[2:]):
+        if not refreshed:
+            # Only the last question onwards is evaluated again: about 50 tokens, not the whole history
+            assert reused >= previous_length - 60, f"reused {reused} of {length} prompt tokens"
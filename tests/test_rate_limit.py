@@ -0,0 +1,54 @@
+import asyncio
+import time
+import httpx
+import services.rate_limit as rate_limit
+from app import app
+from constants import LOGIN_RATE_LIMIT_BURST
+from services.rate_limit import MemoryRateLimitStore
+
+def test_memory_store_forgets_refilled_buckets_and_empty_lease_sets():
+    async def scenario():
+        store = MemoryRateLimitStore()
+        waits = [await store.consume("bucket", 2, 20) for _ in range(3)]
+        await asyncio.sleep(0.15)
+        acquired = await store.acquire_lease("streams", "lease", 1, 60)
+        await store.release_lease("streams", "lease")
+        return store, waits, acquired
+
+    store, waits, acquired = asyncio.run(scenario())
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0
+    assert acquired
+    assert store._buckets.items() == []
+    assert store._leases.items() == []
+
+def test_memory_store_drops_expired_leases():
+    async def scenario():
+        store = MemoryRateLimitStore()
+        await store.acquire_lease("streams", "leaked", 1, 0.05)
+        blocked = not await store.acquire_lease("streams", "second", 1, 0.05)
+        time.sleep(0.1)
+        return store, blocked
+
+    store, blocked = asyncio.run(scenario())
+
+    assert blocked
+    assert store._leases.items() == []
+
+def test_change_password_shares_the_login_limit(sqlite_storage, run_with_storage, monkeypatch):
+    monkeypatch.setattr(rate_limit, "_store", MemoryRateLimitStore())
+
+    async def scenario(storage):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"email": "nobody@example.com", "old_password": "old", "new_password": "new"}
+            return [
+                (await client.post("/api/auth/change-password", json=body)).status_code
+                for _ in range(LOGIN_RATE_LIMIT_BURST + 1)
+            ]
+
+    statuses = run_with_storage(sqlite_storage, scenario)
+
+    assert statuses[:-1] == [404] * LOGIN_RATE_LIMIT_BURST
+    assert statuses[-1] == 429
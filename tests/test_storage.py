@@ -0,0 +1,167 @@
+"""
+Contract tests run against every storage backend, so the SQLite and
+PostgreSQL implementations return the same shapes and orderings.
+"""
+from datetime import datetime, timedelta
+import pytest
+from constants import ADMIN_EMAIL
+import services.storage as storage_module
+from services.files import get_user_audio_service, save_audio_file
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def storage(request):
+    return request.getfixturevalue(f"{request.param}_storage")
+
+def test_chats_page_by_id_and_belong_to_their_user(storage, run_with_storage):
+    async def scenario(storage):
+        owner = await storage.create_user("owner@example.com", "hash")
+        other = await storage.create_user("other@example.com", "hash")
+        chat_ids = [await storage.create_chat(owner, f"Chat {i}") for i in range(5)]
+
+        first_page = await storage.list_chats(owner, None, None, 2)
+        older = await storage.list_chats(owner, first_page[-1]["id"], None, 2)
+        newer = await storage.list_chats(owner, None, chat_ids[0], 2)
+        chat = await storage.get_chat(chat_ids[0])
+        owns = await storage.user_owns_chat(chat_ids[0], owner), await storage.user_owns_chat(chat_ids[0], other)
+        deleted = await storage.delete_chat(chat_ids[0], other), await storage.delete_chat(chat_ids[0], owner)
+        return chat_ids, first_page, older, newer, chat, owns, deleted, await storage.get_chat(chat_ids[0])
+
+    chat_ids, first_page, older, newer, chat, owns, deleted, gone = run_with_storage(storage, scenario)
+
+    assert [c["id"] for c in first_page] == [chat_ids[4], chat_ids[3]]
+    assert [c["id"] for c in older] == [chat_ids[2], chat_ids[1]]
+    assert [c["id"] for c in newer] == chat_ids[1:3]
+    assert chat["title"] == "Chat 0"
+    assert isinstance(chat["created_at"], str)
+    assert owns == (True, False)
+    assert deleted == (False, True)
+    assert gone is None
+
+def test_messages_keep_insertion_order(storage, run_with_storage):
+    async def scenario(storage):
+        user_id = await storage.create_user("user@example.com", "hash")
+        chat_id = await storage.create_chat(user_id, "Chat")
+        ids = []
+        for i in range(6):
+            ids.append(await storage.add_message(chat_id, f"message {i}", i % 2 == 0, "image-1" if i == 3 else None))
+        await storage.set_message_token_counts([(ids[-1], 42)])
+        await storage.save_chat_summary(chat_id, "summary", ids[1])
+        return (
+            ids,
+            await storage.list_messages(chat_id, None, None, 3),
+            await storage.list_messages(chat_id, None, ids[1], 2),
+            await storage.get_recent_messages(chat_id, 3),
+            await storage.get_last_ai_message(chat_id),
+            await storage.get_chat_summary(chat_id),
+            (await storage.user_owns_image("image-1", user_id), await storage.user_owns_image("image-1", user_id + 1)),
+        )
+
+    ids, latest, after, recent, last_ai, summary, owns_image = run_with_storage(storage, scenario)
+
+    assert [m["id"] for m in latest] == ids[:2:-1]
+    assert [m["id"] for m in after] == ids[2:4]
+    assert [m["id"] for m in recent] == ids[3:]
+    assert [bool(m["is_human"]) for m in recent] == [False, True, False]
+    assert recent[-1]["token_count"] == 42
+    assert last_ai["id"] == ids[5]
+    assert summary["summary"] == "summary"
+    assert summary["last_message_id"] == ids[1]
+    assert owns_image == (True, False)
+
+def test_users_and_password_reset(storage, run_with_storage):
+    async def scenario(storage):
+        admin = await storage.get_user_by_email(ADMIN_EMAIL)
+        user_id = await storage.create_user("user@example.com", "temporary-hash")
+        created = await storage.get_user_by_id(user_id)
+        await storage.update_password(user_id, "chosen-hash")
+        updated = await storage.get_user_by_email("user@example.com")
+
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        await storage.create_reset_token(user_id, "reset-token", expires_at)
+        token = await storage.get_reset_token("reset-token")
+        await storage.complete_password_reset(token["id"], user_id, "reset-hash")
+        used = await storage.get_reset_token("reset-token")
+        after_reset = await storage.get_user_by_id(user_id)
+
+        emails = [u["email"] for u in await storage.list_users()]
+        admin_deleted = await storage.delete_user(admin["id"])
+        user_deleted = await storage.delete_user(user_id)
+        return (admin, created, updated, expires_at, token, used, after_reset,
+                emails, admin_deleted, user_deleted, await storage.get_user_by_id(user_id))
+
+    (admin, created, updated, expires_at, token, used, after_reset,
+     emails, admin_deleted, user_deleted, gone) = run_with_storage(storage, scenario)
+
+    assert admin["is_admin"]
+    assert created["is_temporary_password"]
+    assert updated["password_hash"] == "chosen-hash"
+    assert not updated["is_temporary_password"]
+    assert token["email"] == "user@example.com"
+    assert token["used_at"] is None
+    assert abs(token["expires_at"].replace(tzinfo=None) - expires_at) < timedelta(seconds=1)
+    assert isinstance(used["used_at"], datetime)
+    assert after_reset["password_hash"] == "reset-hash"
+    assert "user@example.com" in emails
+    assert (admin_deleted, user_deleted) == (False, True)
+    assert gone is None
+
+def test_audio_files_are_scoped_to_their_owner(storage, run_with_storage):
+    async def scenario(storage):
+        user_id = await storage.create_user("user@example.com", "hash")
+        chat_id = await storage.create_chat(user_id, "Chat")
+        await storage.add_audio_file("chat-audio", user_id, chat_id, "ogg", b"OggS chat")
+        await storage.add_audio_file("loose-audio", user_id, None, "mp3", b"ID3 loose")
+        visible = await storage.get_user_audio_file("chat-audio", user_id)
+        hidden = await storage.get_user_audio_file("chat-audio", user_id + 1)
+        fresh = await storage.delete_audio_files_older_than(3600)
+        await storage.delete_chat(chat_id, user_id)
+        chat_gone = await storage.get_user_audio_file("chat-audio", user_id)
+        loose = await storage.get_user_audio_file("loose-audio", user_id)
+        await storage.delete_user(user_id)
+        user_gone = await storage.get_user_audio_file("loose-audio", user_id)
+        return visible, hidden, fresh, chat_gone, loose, user_gone
+
+    visible, hidden, fresh, chat_gone, loose, user_gone = run_with_storage(storage, scenario)
+
+    assert visible["format"] == "ogg"
+    assert bytes(visible["data"]) == b"OggS chat"
+    assert hidden is None
+    assert fresh == 0
+    assert chat_gone is None
+    assert bytes(loose["data"]) == b"ID3 loose"
+    assert user_gone is None
+
+def test_saved_audio_is_served_from_the_database(storage, run_with_storage, monkeypatch):
+    monkeypatch.setattr(storage_module, "_storage", storage)
+
+    async def scenario(storage):
+        user_id = await storage.create_user("user@example.com", "hash")
+        audio_id = await save_audio_file(b"RIFF audio", "wav", user_id)
+        return await get_user_audio_service(audio_id, {"id": user_id})
+
+    response = run_with_storage(storage, scenario)
+
+    assert response.body == b"RIFF audio"
+    assert response.media_type == "audio/wav"
+
+def test_chat_and_message_indexes_match_the_keyset_queries(storage, run_with_storage):
+    async def scenario(storage):
+        if hasattr(storage, "pool"):
+            rows = await storage.pool.fetch(
+                "SELECT indexname AS name FROM pg_indexes WHERE tablename IN ('chats', 'messages')"
+            )
+        else:
+            from services.database import get_db_connection_service, run_db
+
+            def sqlite_indexes():
+                with get_db_connection_service() as db:
+                    return db.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name IN ('chats', 'messages')"
+                    ).fetchall()
+            rows = await run_db(sqlite_indexes)
+        return {row["name"] for row in rows}
+
+    names = run_with_storage(storage, scenario)
+
+    assert {"idx_chats_user_id", "idx_messages_chat_id"} <= names
+    assert not names & {"idx_chats_user_created", "idx_messages_chat_created"}
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import time
+import httpx
+import services.broker as broker
+import services.stream as stream
+from app import app
+from services.auth import create_access_token
+from services.llm_scheduler import LLMScheduler
+from services.passwords import hash_password_sync
+
+STEP_SECONDS = 0.5
+MAX_PROBE_SECONDS = 0.1
+
+class SlowAgent:
+    """Stand-in for the AgentExecutor whose steps block like LLM calls"""
+
+    def iter(self, agent_input, callbacks=None):
+        for _ in range(3):
+            time.sleep(STEP_SECONDS)
+            yield {"intermediate_step": []}
+        yield {"output": "Done thinking."}
+
+class HungAgent:
+    """Stand-in for an agent stuck inside a model call that yields no step"""
+
+    def iter(self, agent_input, callbacks=None):
+        time.sleep(1)
+        yield {"output": "Too late."}
+
+def test_generation_timeout_fires_without_a_step(sqlite_storage, run_with_storage, monkeypatch):
+    scheduler = LLMScheduler(generation_timeout=0.2)
+    monkeypatch.setattr(stream, "get_agent", HungAgent)
+    monkeypatch.setattr(stream, "get_llm_scheduler", lambda: scheduler)
+    monkeypatch.setattr(broker, "BROKER_CONNECT_WAIT", 0)
+
+    async def scenario(storage):
+        await storage.create_user("user@example.com", hash_password_sync("password"), False)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            start = time.perf_counter()
+            response = await client.post("/stream/", json={"question": "Hang", "chat_id": None})
+            return response, time.perf_counter() - start
+
+    response, elapsed = run_with_storage(sqlite_storage, scenario)
+
+    assert "No answer generated" in response.text
+    assert elapsed < 0.8
+    assert scheduler.stats()["running"] == 0
+    # Let the stuck call finish before the next test needs the agent executor
+    time.sleep(1)
+
+def test_other_endpoints_stay_fast_during_a_long_generation(sqlite_storage, run_with_storage, monkeypatch):
+    monkeypatch.setattr(stream, "get_agent", SlowAgent)
+    # No RabbitMQ here; the TTS relay gives up at once instead of waiting to connect
+    monkeypatch.setattr(broker, "BROKER_CONNECT_WAIT", 0)
+
+    async def scenario(storage):
+        await storage.create_user("user@example.com", hash_password_sync("password"), False)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+            generation = asyncio.create_task(
+                client.post("/stream/", json={"question": "Think for a while", "chat_id": None})
+            )
+            probes = []
+            while not generation.done():
+                start = time.perf_counter()
+                response = await client.get("/api/auth/me")
+                probes.append(time.perf_counter() - start)
+                assert response.status_code == 200
+                await asyncio.sleep(0.05)
+            return await generation, probes
+
+    response, probes = run_with_storage(sqlite_storage, scenario)
+
+    events = [block.split("\n") for block in response.text.split("\n\n") if block]
+    final_answer = next(json.loads(lines[1][len("data: "):]) for lines in events if lines[0] == "event: final_answer")
+    assert final_answer["answer"] == "Done thinking."
+    assert len(probes) >= 10, f"only {len(probes)} /api/auth/me calls completed during generation"
+    assert max(probes) < MAX_PROBE_SECONDS, f"slowest /api/auth/me took {max(probes) * 1000:.0f} ms"